@@ -0,0 +1,59 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Background data acquisition. Fetches that do not depend on any computation (price
+# chunks of the universe, the Fama-French table, the benchmark ETF) are submitted up
+# front to a thread pool and retried with exponential backoff; the pipeline picks up
+# their results when it needs them and can start on price chunks as they complete.
+
+WORKERS = 4
+CHUNK_SIZE = 100
+RETRIES = 3
+BACKOFF = 1.0
+
+
+def with_retries(func, *args, retries=RETRIES, backoff=BACKOFF, **kwargs):
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            logger.warning('%s failed (%s: %s), retrying in %.1fs',
+                           getattr(func, '__name__', func), type(e).__name__, e, delay)
+            time.sleep(delay)
+
+
+class Acquisition:
+    def __init__(self, workers=WORKERS, chunk_size=CHUNK_SIZE, retries=RETRIES, backoff=BACKOFF):
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='acquisition')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.executor.shutdown(wait=exc_type is None, cancel_futures=exc_type is not None)
+
+    def submit(self, func, *args, **kwargs):
+        return self.executor.submit(with_retries, func, *args, retries=self.retries, backoff=self.backoff, **kwargs)
+
+    def chunks(self, tickers):
+        tickers = list(dict.fromkeys(tickers))
+        return [tickers[i:i + self.chunk_size] for i in range(0, len(tickers), self.chunk_size)]
+
+    # One future per chunk of `tickers`, each running func(chunk, *args, **kwargs)
+    def submit_chunks(self, func, tickers, *args, **kwargs):
+        return [self.submit(func, chunk, *args, **kwargs) for chunk in self.chunks(tickers)]
+
+
+# Results of `futures` in completion order
+def completed(futures):
+    for future in as_completed(futures):
+        yield future.result()
@@ -1,10 +1,18 @@
+import os
+import json
+import functools
 import streamlit as st
+import pandas as pd
 from datetime import datetime, timedelta
 
 # Import the functions you modularized above
 import feature_creater
 import k_means_algorithm
 import portfolio_optimization
+import stage_cache
+import instrumentation
+import acquisition
+import robustness
 
 # Common Stock Indexes with their Symbols
 INDEX_OPTIONS = {
@@ -41,23 +49,48 @@ def main():
         st.session_state['clustered_df'] = None
     if 'portfolio_df' not in st.session_state:
         st.session_state['portfolio_df'] = None
+    if 'rebalances' not in st.session_state:
+        st.session_state['rebalances'] = None
+    if 'run_profile' not in st.session_state:
+        st.session_state['run_profile'] = None
+
+    trace_memory = st.sidebar.checkbox("Trace memory per stage", value=False)
+    profile = st.sidebar.checkbox("Profile with cProfile", value=False,
+                                  help="Covers the main pipeline thread only, not the download threads or "
+                                       "the optimization worker processes. One run is profiled at a time.")
+    show_bands = st.sidebar.checkbox("Resampled confidence bands", value=False)
 
     # Calculate Features and K-means button
     if st.button("Calculate Features, K-means Clustering, and Portfolio Performance"):
-        # Calculate features
-        df = calculate_features(tickers_list, real_start_date, end_date, number_of_stocks)
-        if df is not None and not df.empty:
-            st.session_state['features_df'] = df
-            features_success = st.success("Features calculated successfully!")
-            
-            # Calculate K-means
-            df_with_clusters = k_means_algorithm.run_k_means_algorithm(df)
-            st.session_state['clustered_df'] = df_with_clusters
-            kmean_success = st.success("K-means clustering completed!")
-
-            # Run portfolio optimization and store the result
-            st.session_state['portfolio_df'] = portfolio_optimization.run_portfolio_optimization(df_with_clusters, displayed_start_date, index_choice)
-            portfolio_success = st.success("Portfolio Performance completed!")
+        recorder = instrumentation.Recorder(trace_memory=trace_memory, profile=profile)
+        with instrumentation.recording(recorder), acquisition.Acquisition() as fetcher:
+            # The benchmark doesn't depend on anything computed, fetch it alongside the features
+            benchmark = fetcher.submit(portfolio_optimization.download_benchmark, displayed_start_date, index_choice)
+
+            # Calculate features
+            df = instrumentation.run('features', calculate_features, tickers_list, real_start_date, end_date, number_of_stocks, fetcher)
+            if df is not None and not df.empty:
+                st.session_state['features_df'] = df
+                features_success = st.success("Features calculated successfully!")
+
+                # Calculate K-means
+                df_with_clusters = instrumentation.run('clusters', stage_cache.get_default_cache().run, 'clusters',
+                                                       k_means_algorithm.run_k_means_algorithm, df)
+                st.session_state['clustered_df'] = df_with_clusters
+                kmean_success = st.success("K-means clustering completed!")
+
+                # Run portfolio optimization and store the result
+                with instrumentation.stage('portfolio'):
+                    result = portfolio_optimization.run_portfolio_attribution(df_with_clusters, displayed_start_date, index_choice,
+                                                                              cache=stage_cache.get_default_cache(),
+                                                                              benchmark_prices=benchmark.result())
+                st.session_state['portfolio_df'] = result['returns']
+                # For resampling the rebalance weights (display_robustness)
+                st.session_state['rebalances'] = {'weights': result['weights'], 'contributions': result['contributions']}
+                portfolio_success = st.success("Portfolio Performance completed!")
+
+        st.session_state['run_profile'] = recorder.to_dict()
+        save_run_profile(st.session_state['run_profile'])
 
 
     # Display results if they exist
@@ -73,26 +106,62 @@ def main():
             kmean_success.empty()
         display_plots(st.session_state['clustered_df'])
 
+    if st.session_state['run_profile'] is not None:
+        display_run_profile(st.session_state['run_profile'])
+
     # Display the stock chart last
     if st.session_state['portfolio_df'] is not None:
         if portfolio_success:
             portfolio_success.empty()
         draw_graph(st.session_state['portfolio_df'])
+        if show_bands:
+            display_robustness(st.session_state['portfolio_df'], st.session_state['rebalances'])
 
 
 
-def calculate_features(tickers_list, real_start_date, end_date, number_of_stocks):
+def calculate_features(tickers_list, real_start_date, end_date, number_of_stocks, fetcher=None):
     if not tickers_list:
         st.warning("Please enter at least one stock symbol.")
     else:
         # st.write("Downloading data for:", tickers_list)
         try:
                 # Load and compute features
-            return feature_creater.load_and_create_all_features(tickers_list, real_start_date, end_date, number_of_stocks)
+            return stage_cache.get_default_cache().run('features', functools.partial(feature_creater.load_and_create_all_features, fetcher=fetcher),
+                                                       tickers_list, real_start_date, end_date, number_of_stocks,
+                                                       key=stage_cache.as_of(end_date))
         except Exception as e:
             st.error(f"An error occurred: {e}")
 
 
+# Each run's profile is also written to PIPELINE_METRICS_DIR, when set, for monitoring
+def save_run_profile(run_profile):
+    directory = os.environ.get('PIPELINE_METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        name = f"run-{run_profile['started'].replace(':', '')}.json"
+        with open(os.path.join(directory, name), 'w') as f:
+            json.dump(run_profile, f, default=str)
+
+
+def display_run_profile(run_profile):
+    st.sidebar.header("Run Profile")
+    stages = pd.DataFrame(run_profile['stages'], columns=['stage', 'seconds', 'cpu_seconds', 'peak_bytes', 'rows', 'error'])
+    stages['peak_mb'] = stages.pop('peak_bytes') / 2**20
+    st.sidebar.dataframe(stages.set_index('stage'))
+
+    months = pd.DataFrame(run_profile['months'], columns=['date', 'tickers', 'seconds', 'failure'])
+    st.sidebar.write(f"Rebalance months: {len(months)}, solver failures: {run_profile['solver_failures']}")
+    if not months.empty:
+        st.sidebar.dataframe(months.set_index('date'))
+
+    if run_profile['profile']:
+        with st.sidebar.expander("cProfile (cumulative, main pipeline thread only)"):
+            st.text(run_profile['profile'])
+
+    st.sidebar.download_button("Download profile (JSON)", json.dumps(run_profile, default=str, indent=2),
+                               file_name="run_profile.json", mime="application/json")
+
+
 def display_plots(df_with_clusters):
     st.title("K-Means Clustering Visualization")
     
@@ -116,5 +185,24 @@ def draw_graph(portfolio_df):
     st.pyplot(fig)
 
 
+def display_robustness(portfolio_df, rebalances):
+    st.title("Robustness:")
+    method = st.radio("Resampling:", ['bootstrap', 'weights'],
+                      format_func={'bootstrap': "Block bootstrap of days", 'weights': "Perturbed rebalance weights"}.get)
+    n_paths = st.number_input("Paths:", min_value=100, max_value=20000, value=robustness.N_PATHS, step=1000)
+    # The weights only matter (and are only hashed) when they are resampled
+    rebalances = rebalances if method == 'weights' else {}
+    result = resample_returns(portfolio_df, method, int(n_paths), **rebalances)
+    st.dataframe(result['bands'])
+    st.pyplot(robustness.draw_bands(portfolio_df, result['growth']))
+
+
+# Cached on the returns, method, path count and rebalances, so reruns don't resample again
+@st.cache_data(max_entries=8)
+def resample_returns(portfolio_df, method, n_paths, weights=None, contributions=None):
+    return robustness.run_robustness(portfolio_df, method, n_paths=n_paths, seed=0, weights=weights,
+                                     contributions=contributions)
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# Strategy returns for a sequence of monthly rebalances. Each rebalance's weights are held
+# from its start date to the end of that month. The weights of every rebalance are laid
+# out as one dates x tickers matrix aligned with the daily returns, so the strategy
+# return, the per-ticker contributions and the turnover come from a single pass.
+
+
+# Monthly weights ({start date: weights Series}) as a rebalances x tickers frame; tickers
+# a rebalance does not hold are NaN, held tickers with zero weight stay 0
+def rebalance_weights(month_weights, tickers=None):
+    if tickers is None:
+        tickers = pd.Index([t for w in month_weights.values() for t in w.index]).unique()
+
+    weights = np.full((len(month_weights), len(tickers)), np.nan)
+    for i, w in enumerate(month_weights.values()):
+        positions = tickers.get_indexer(w.index)
+        weights[i, positions[positions >= 0]] = w.to_numpy(dtype=float)[positions >= 0]
+
+    dates = pd.DatetimeIndex([pd.Timestamp(d) for d in month_weights])
+    return pd.DataFrame(weights, index=dates, columns=tickers).sort_index()
+
+
+# Dates x tickers weights in force on each date of `dates` (NaN outside any rebalance
+# month or for tickers not held that month)
+def weight_matrix(dates, weights):
+    dates = pd.DatetimeIndex(dates)
+    starts = weights.index
+    ends = starts + pd.offsets.MonthEnd(0)
+
+    month = starts.searchsorted(dates, side='right') - 1
+    in_month = (month >= 0) & (dates <= ends[np.maximum(month, 0)])
+
+    matrix = np.full((len(dates), weights.shape[1]), np.nan)
+    matrix[in_month] = weights.to_numpy(dtype=float)[month[in_month]]
+    return pd.DataFrame(matrix, index=dates, columns=weights.columns)
+
+
+# `returns` is dates x tickers (log) returns. Returns a dict with
+#   'returns':       'Strategy Return' on every day a held ticker has a return,
+#   'contributions': dates x tickers weight * return on those days,
+#   'turnover':      sum of absolute weight changes at each rebalance (the first
+#                    rebalance counts its full allocation).
+def attribute_returns(returns, month_weights):
+    tickers = returns.columns.union(pd.Index([t for w in month_weights.values() for t in w.index]).unique())
+    weights = rebalance_weights(month_weights, tickers)
+    returns = returns.reindex(columns=tickers)
+
+    if weights.empty:
+        empty = pd.DataFrame(columns=['Strategy Return'], index=returns.index[:0], dtype=float)
+        return {'returns': empty,
+                'contributions': returns.iloc[:0],
+                'turnover': pd.Series(dtype=float)}
+
+    held = weight_matrix(returns.index, weights).to_numpy()
+    values = returns.to_numpy(dtype=float)
+    active = (~np.isnan(held) & ~np.isnan(values)).any(axis=1)
+
+    contributions = np.where(np.isnan(held) | np.isnan(values), 0.0, held * values)[active]
+    contributions = pd.DataFrame(contributions, index=returns.index[active], columns=tickers)
+
+    strategy = contributions.sum(axis=1).to_frame('Strategy Return')
+
+    allocations = weights.fillna(0)
+    turnover = allocations.diff().abs().sum(axis=1)
+    turnover.iloc[0] = allocations.iloc[0].abs().sum()
+
+    return {'returns': strategy,
+            'contributions': contributions,
+            'turnover': turnover.rename('turnover')}
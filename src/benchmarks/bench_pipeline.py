@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import feature_creater
+import k_means_algorithm
+import portfolio_optimization
+import rebalance_scheduler
+import synthetic_data
+
+# Times and memory-profiles every pipeline stage on synthetic data (no network), for a
+# grid of universe sizes and history lengths, and writes the results as JSON. Each stage
+# runs once for wall/CPU time and, unless --no-memory, once more under tracemalloc for
+# its peak allocation. Stages that modify their input get a fresh copy for each pass,
+# made outside the measured region. Cases above --max-rows daily rows are recorded as
+# skipped.
+#
+#   python src/benchmarks/bench_pipeline.py --tickers 30 500 --years 5 15 --output bench.json
+#   python src/benchmarks/bench_pipeline.py --baseline previous.json
+
+TICKER_COUNTS = [30, 500, 3000, 10000]
+YEARS = [5, 15, 25]
+MAX_ROWS = 20_000_000
+
+# optimize_weights is timed on a sample of months spread over the history
+OPTIMIZE_SAMPLE = 24
+
+
+# `setup` returns the arguments of `func` for one pass
+def measure(func, memory=True, setup=tuple):
+    args = setup()
+    wall, cpu = time.perf_counter(), time.process_time()
+    value = func(*args)
+    stats = {'seconds': time.perf_counter() - wall, 'cpu_seconds': time.process_time() - cpu}
+    if memory:
+        args = setup()
+        tracemalloc.start()
+        try:
+            func(*args)
+            stats['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return value, stats
+
+
+def optimize_sample(prices, fixed_dates):
+    windows = rebalance_scheduler.month_windows(prices, fixed_dates)
+    sample = [windows[i] for i in np.unique(np.linspace(0, len(windows) - 1, OPTIMIZE_SAMPLE).astype(int))] if windows else []
+    failures = 0
+    for _, row_start, row_stop, cols in sample:
+        try:
+            portfolio_optimization.optimize_weights(prices=prices.iloc[row_start:row_stop][cols],
+                                                    lower_bound=round(1/(len(cols)*2), 3))
+        except Exception:
+            failures += 1
+    return len(sample), failures
+
+
+def run_case(n_tickers, years, workers=None, memory=True):
+    records = []
+
+    def stage(name, func, rows, setup=tuple):
+        value, stats = measure(func, memory, setup)
+        records.append({'tickers': n_tickers, 'years': years, 'stage': name, 'rows': rows, **stats})
+        print(f'{n_tickers:>7}{years:>6}  {name:<24}{stats["seconds"]:>10.3f}'
+              f'{stats.get("peak_bytes", np.nan) / 2**20:>12.1f}', flush=True)
+        return value
+
+    ohlcv = synthetic_data.daily_ohlcv(n_tickers, years)
+    dates = ohlcv.index.get_level_values('date')
+    start_date, end_date = dates[0], dates[-1]
+    factors = synthetic_data.factor_table(start_date, end_date)
+
+    # calculate_indicators adds its columns to the frame it is given
+    daily = stage('calculate_indicators', feature_creater.calculate_indicators, len(ohlcv), lambda: (ohlcv.copy(),))
+    monthly = stage('aggregate_to_monthly', lambda: feature_creater.aggregate_to_monthly(daily, n_tickers), len(daily))
+    with_returns = stage('calculate_returns',
+                         lambda: monthly.groupby(level=1, group_keys=False).apply(feature_creater.calculate_returns).dropna(),
+                         len(monthly))
+    stage('calculate_factor_betas',
+          lambda: feature_creater.calculate_factor_betas(with_returns, start_date, factors), len(with_returns))
+
+    features = feature_creater.create_monthly_features(monthly, start_date, factors)
+    clustered = stage('run_k_means_algorithm', lambda: k_means_algorithm.run_k_means_algorithm(features), len(features))
+
+    fixed_dates = portfolio_optimization.tickers_for_each_month(clustered)
+    prices = synthetic_data.adjusted_closes(ohlcv)
+    calls, failures = stage('optimize_weights', lambda: optimize_sample(prices, fixed_dates), len(fixed_dates))
+    records[-1].update(calls=calls, failures=failures)
+
+    daily_prices = pd.concat({'Adj Close': prices}, axis=1)
+    result = stage('get_portfolio_returns',
+                   lambda: portfolio_optimization.get_portfolio_attribution(daily_prices, fixed_dates, workers),
+                   len(fixed_dates))
+    records[-1].update(failures=len(result['failures']))
+    return records
+
+
+def environment():
+    return {'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'timestamp': pd.Timestamp.now().isoformat(timespec='seconds')}
+
+
+def run(ticker_counts=TICKER_COUNTS, years=YEARS, max_rows=MAX_ROWS, workers=None, memory=True):
+    warnings.filterwarnings('ignore')
+    logging.getLogger('rebalance_scheduler').setLevel(logging.ERROR)
+    results = []
+    print(f'{"tickers":>7}{"years":>6}  {"stage":<24}{"seconds":>10}{"peak MiB":>12}')
+    for n_tickers in ticker_counts:
+        for n_years in years:
+            if n_tickers * n_years * 252 > max_rows:
+                results.append({'tickers': n_tickers, 'years': n_years, 'skipped': f'more than {max_rows} daily rows'})
+                continue
+            try:
+                results.extend(run_case(n_tickers, n_years, workers, memory))
+            except Exception as e:
+                results.append({'tickers': n_tickers, 'years': n_years, 'error': f'{type(e).__name__}: {e}'})
+    return {'environment': environment(), 'results': results}
+
+
+# Wall-time ratio of every stage against a previous results file
+def compare(report, baseline):
+    old = {(r['tickers'], r['years'], r['stage']): r['seconds'] for r in baseline['results'] if 'stage' in r}
+    print(f'{"tickers":>7}{"years":>6}  {"stage":<24}{"before":>10}{"after":>10}{"ratio":>8}')
+    for r in report['results']:
+        key = (r['tickers'], r['years'], r.get('stage'))
+        if key in old:
+            print(f'{key[0]:>7}{key[1]:>6}  {key[2]:<24}{old[key]:>10.3f}{r["seconds"]:>10.3f}{r["seconds"] / old[key]:>8.2f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on synthetic data.')
+    parser.add_argument('--tickers', nargs='+', type=int, default=TICKER_COUNTS)
+    parser.add_argument('--years', nargs='+', type=int, default=YEARS)
+    parser.add_argument('--max-rows', type=int, default=MAX_ROWS)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--no-memory', action='store_true')
+    parser.add_argument('--output', default='bench_pipeline.json')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    report = run(args.tickers, args.years, args.max_rows, args.workers, not args.no_memory)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if baseline is not None:
+        compare(report, baseline)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
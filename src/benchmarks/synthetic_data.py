@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# Offline stand-ins for the pipeline's downloaded inputs: daily OHLCV in the layout of
+# feature_creater.load_stock_data and a monthly Fama-French 5-factor table in the layout
+# of factor_engine.load_factor_data.
+
+FACTORS = ['Mkt-RF', 'SMB', 'HML', 'RMW', 'CMA']
+
+
+def ticker_names(n_tickers):
+    return [f'T{i:05d}' for i in range(n_tickers)]
+
+
+# Daily bars for `n_tickers` over `years` of business days, indexed (date, ticker) and
+# sorted by date like the stacked download. Returns follow a one-factor model; a fifth of
+# the tickers list part-way through the history.
+def daily_ohlcv(n_tickers, years, start_date='2000-01-03', seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start_date, periods=int(years * 252))
+    n_days = len(dates)
+
+    market = rng.normal(3e-4, 0.01, n_days).astype(np.float32)
+    betas = rng.uniform(0.5, 1.5, n_tickers).astype(np.float32)
+    drift = rng.normal(2e-4, 3e-4, n_tickers).astype(np.float32)
+    returns = market[:, None] * betas + drift + rng.standard_normal((n_days, n_tickers), dtype=np.float32) * 0.015
+    close = 20 * np.exp(np.cumsum(returns, axis=0, dtype=np.float64))
+    del returns
+
+    first_day = np.where(rng.random(n_tickers) < 0.2, rng.integers(0, int(n_days * 0.6), n_tickers), 0)
+    listed = np.arange(n_days)[:, None] >= first_day
+    day, ticker = np.nonzero(listed)
+    close = close[day, ticker]
+
+    gap = np.exp(rng.normal(0, 0.004, len(close)))
+    open_ = close * gap
+    spread = np.exp(np.abs(rng.normal(0, 0.008, (2, len(close)))))
+    high = np.maximum(open_, close) * spread[0]
+    low = np.minimum(open_, close) / spread[1]
+    volume = np.round(np.exp(rng.normal(13, 1, n_tickers))[ticker] * np.exp(rng.normal(0, 0.3, len(close))))
+
+    index = pd.MultiIndex.from_arrays([dates[day], np.asarray(ticker_names(n_tickers), dtype=object)[ticker]],
+                                      names=['date', 'ticker'])
+    return pd.DataFrame({'adj close': close * 0.97, 'close': close, 'high': high,
+                         'low': low, 'open': open_, 'volume': volume}, index=index)
+
+
+# Daily adjusted closes as dates x tickers, the layout the portfolio stage downloads
+def adjusted_closes(ohlcv):
+    return ohlcv['adj close'].unstack('ticker')
+
+
+# Monthly factor returns in percent with a month-start index, covering `start_date` to
+# `end_date`
+def factor_table(start_date, end_date, seed=0):
+    rng = np.random.default_rng(seed)
+    months = pd.date_range(pd.Timestamp(start_date).to_period('M').to_timestamp(), end_date, freq='MS')
+    values = rng.normal([0.7, 0.1, 0.2, 0.3, 0.2], [4.5, 3.0, 3.0, 2.0, 2.0], (len(months), len(FACTORS)))
+    table = pd.DataFrame(values.round(2), index=months, columns=FACTORS)
+    table['RF'] = 0.15
+    return table
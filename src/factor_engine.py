@@ -0,0 +1,125 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import pandas_datareader.data as web
+import indicator_engine
+import price_store
+
+FACTOR_DATASET = 'F-F_Research_Data_5_Factors_2x3'
+
+FACTOR_CACHE_DIR = os.environ.get('FACTOR_CACHE_DIR',
+                                  os.path.join(os.path.dirname(price_store.DEFAULT_STORE_DIR), 'factors'))
+
+# The Fama-French library is updated monthly, a week-old copy is current enough
+FACTOR_CACHE_MAX_AGE = 7 * 24 * 3600
+
+
+# Monthly Fama-French 5-factor table (percent returns, month-start index), served from a
+# local cache and refreshed from the French data library when stale or too short
+def load_factor_data(start_date, cache_dir=FACTOR_CACHE_DIR):
+    path = os.path.join(cache_dir, FACTOR_DATASET + '.parquet')
+    start = pd.Timestamp(start_date).to_period('M').to_timestamp()
+
+    cached = pd.read_parquet(path) if os.path.exists(path) else None
+    fresh = (cached is not None
+             and time.time() - os.path.getmtime(path) < FACTOR_CACHE_MAX_AGE
+             and cached.index[0] <= start)
+
+    if not fresh:
+        try:
+            download_start = start if cached is None else min(start, cached.index[0])
+            factor_data = web.DataReader(FACTOR_DATASET, 'famafrench', start=download_start)[0]
+            factor_data.index = factor_data.index.to_timestamp()
+            os.makedirs(cache_dir, exist_ok=True)
+            price_store.write_atomic(path, factor_data.to_parquet)
+            cached = factor_data
+        except Exception:
+            # Offline: a stale cache is better than no factors at all
+            if cached is None:
+                raise
+
+    return cached[start:]
+
+
+# Rolling OLS of `endog` on a constant plus every other column, for all tickers at once.
+# Reproduces statsmodels' RollingOLS(window=min(window, n_obs), min_nobs=min_nobs) run per
+# ticker over its own rows: windowed X'X / X'y come from cumulative sums along each
+# ticker's compacted history and all windows are solved as one batch of k x k systems.
+def rolling_betas(data, endog='return_1m', window=24, min_nobs=None, chunk_size=256):
+    exog = [c for c in data.columns if c != endog]
+    k = len(exog) + 1
+    min_nobs = k + 1 if min_nobs is None else min_nobs
+
+    rows, cols, _, (n_rows, n_tickers) = indicator_engine.compact_index(data.index)
+    x_values = data[exog].to_numpy(dtype=float)
+    y_values = data[endog].to_numpy(dtype=float)
+    ok = np.isfinite(x_values).all(axis=1) & np.isfinite(y_values)
+
+    # Regressors and target with the variable axis first; missing rows stay all-zero so
+    # they drop out of every sum (and out of the observation count held in the constant)
+    Z = np.zeros((k + 1, n_rows, n_tickers))
+    Z[0, rows[ok], cols[ok]] = 1.0
+    Z[1:k, rows[ok], cols[ok]] = x_values[ok].T
+    Z[k, rows[ok], cols[ok]] = y_values[ok]
+
+    # Unique entries of X'X (upper triangle) followed by X'y, and where each X'X entry lives
+    upper_i, upper_j = np.triu_indices(k)
+    left = np.concatenate([upper_i, np.arange(k)])
+    right = np.concatenate([upper_j, np.full(k, k)])
+    packed = np.zeros((k, k), dtype=int)
+    packed[upper_i, upper_j] = packed[upper_j, upper_i] = np.arange(len(upper_i))
+
+    counts = np.bincount(cols, minlength=n_tickers)
+    window = min(window, n_rows)
+    params = np.full((k, n_rows, n_tickers), np.nan)
+
+    for start in range(0, n_tickers, chunk_size):
+        chunk = slice(start, min(start + chunk_size, n_tickers))
+        chunk_counts = counts[chunk]
+
+        sums = np.zeros((len(left), n_rows + 1, chunk_counts.size))
+        np.cumsum(Z[left, :, chunk] * Z[right, :, chunk], axis=1, out=sums[:, 1:])
+
+        # Tickers with a full window roll it over their rows; shorter histories fit one
+        # window over everything, ending on their last row
+        window_sums = sums[:, window:] - sums[:, :-window]
+        solvable = (np.arange(window - 1, n_rows)[:, None] < chunk_counts) & (chunk_counts >= window)
+        short = np.flatnonzero((chunk_counts < window) & (chunk_counts > 0))
+
+        batch = np.concatenate([window_sums[:, solvable], sums[:, chunk_counts[short], short]], axis=1)
+        batch_rows = np.concatenate([np.nonzero(solvable)[0] + window - 1, chunk_counts[short] - 1])
+        batch_cols = np.concatenate([np.nonzero(solvable)[1], short]) + start
+
+        # Windows with too few complete observations are left unestimated
+        enough = batch[packed[0, 0]] >= min_nobs
+        batch, batch_rows, batch_cols = batch[:, enough], batch_rows[enough], batch_cols[enough]
+
+        params[:, batch_rows, batch_cols] = solve_spd_batch(batch[packed], batch[len(upper_i):])
+
+    return pd.DataFrame(params[1:, rows, cols].T, index=data.index, columns=exog)
+
+
+# Solves a batch of symmetric positive definite systems A[:, :, i] x = b[:, i] by
+# Gaussian elimination vectorized across the batch (no per-matrix LAPACK call),
+# overwriting A and b. Singular systems, which RollingOLS leaves unestimated,
+# come back as NaN.
+def solve_spd_batch(A, b):
+    k = A.shape[0]
+    scale = np.abs(A[np.arange(k), np.arange(k)]).max(axis=0)
+    singular = np.zeros(A.shape[2:], dtype=bool)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for j in range(k):
+            pivot = A[j, j]
+            singular |= ~(pivot > 1e-12 * scale)
+            factor = A[j + 1:, j] / pivot
+            A[j + 1:, j:] -= factor[:, None] * A[j, j:][None]
+            b[j + 1:] -= factor * b[j]
+
+        x = np.zeros(b.shape)
+        for j in reversed(range(k)):
+            x[j] = (b[j] - (A[j, j + 1:] * x[j + 1:]).sum(axis=0)) / A[j, j]
+
+    x[:, singular] = np.nan
+    return x
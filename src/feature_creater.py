@@ -1,67 +1,67 @@
 import pandas as pd
 import numpy as np
-import pandas_ta
-import statsmodels.api as sm
-from statsmodels.regression.rolling import RollingOLS
-import yfinance as yf
-import pandas_datareader.data as web
+import price_store
+import indicator_engine
+import factor_engine
+import instrumentation
+import panel
+import acquisition
 
 # 1. Download stock data
 def load_stock_data(tickers, start_date, end_date):
-    df = yf.download(tickers=tickers, start=start_date, end=end_date).stack()
+    df = price_store.download(tickers, start_date, end_date).stack()
     df.index.names = ['date', 'ticker']
     df.columns = df.columns.str.lower()
     return df
 
 # 2. Calculate technical indicators
-def calculate_indicators(df):
-    df['garman_klass_vol'] = ((np.log(df['high'])-np.log(df['low']))**2)/2-(2*np.log(2)-1)*((np.log(df['adj close'])-np.log(df['open']))**2)
-
-    df['rsi'] = df.groupby(level=1)['adj close'].transform(lambda x: pandas_ta.rsi(close=x, length=20))
-
-    df['bb_low'] = df.groupby(level=1)['adj close'].transform(lambda x: pandas_ta.bbands(close=np.log1p(x), length=20).iloc[:,0])
-                                                            
-    df['bb_mid'] = df.groupby(level=1)['adj close'].transform(lambda x: pandas_ta.bbands(close=np.log1p(x), length=20).iloc[:,1])
-                                                            
-    df['bb_high'] = df.groupby(level=1)['adj close'].transform(lambda x: pandas_ta.bbands(close=np.log1p(x), length=20).iloc[:,2])
+def calculate_garman_klass_vol(df):
+    return ((np.log(df['high'])-np.log(df['low']))**2)/2-(2*np.log(2)-1)*((np.log(df['adj close'])-np.log(df['open']))**2)
 
-    def compute_atr(stock_data):
-        atr = pandas_ta.atr(high=stock_data['high'],
-                            low=stock_data['low'],
-                            close=stock_data['close'],
-                            length=14)
-        return atr.sub(atr.mean()).div(atr.std())
+def calculate_indicators(df):
+    df['garman_klass_vol'] = calculate_garman_klass_vol(df)
 
-    df['atr'] = df.groupby(level=1, group_keys=False).apply(compute_atr)
+    rows, cols, _, shape = indicator_engine.compact_index(df.index)
+    prices = {c: indicator_engine.to_compact(df[c].to_numpy(dtype=float), rows, cols, shape) for c in ['adj close', 'close', 'high', 'low']}
+    present = indicator_engine.to_compact(1.0, rows, cols, shape) == 1.0
 
-    def compute_macd(close):
-        macd = pandas_ta.macd(close=close, length=20).iloc[:,0]
-        return macd.sub(macd.mean()).div(macd.std())
+    indicators = indicator_engine.compute_indicators(prices['adj close'], prices['close'], prices['high'], prices['low'], present)
 
-    df['macd'] = df.groupby(level=1, group_keys=False)['adj close'].apply(compute_macd)
+    for name in ['rsi', 'bb_low', 'bb_mid', 'bb_high', 'atr', 'macd']:
+        df[name] = indicators[name][rows, cols]
 
     df['dollar_volume'] = (df['adj close']*df['volume'])/1e6
     
     return df
 
 # 3. Aggregate to monthly data
-def aggregate_to_monthly(df, number_of_stocks):
+# Monthly mean dollar volume and last value of every other kept column, for the
+# (month, ticker) pairs where all of them are present. Resampled on a float32 panel
+# (see panel.py) rather than by unstacking the daily frame.
+def resample_to_monthly(df):
     last_cols = [c for c in df.columns if c not in ['dollar_volume', 'volume', 'open', 'high', 'low', 'close']]
-    data = pd.concat([
-        df.unstack('ticker')['dollar_volume'].resample('M').mean().stack('ticker').to_frame('dollar_volume'),
-        df[last_cols].unstack('ticker').resample('M').last().stack('ticker')
-    ], axis=1).dropna()
-    
-    data['dollar_volume'] = (data.loc[:, 'dollar_volume'].unstack('ticker').rolling(5*12, min_periods=12).mean().stack())
+    monthly = panel.Panel.monthly_from_frame(df, {'dollar_volume': 'mean', **{c: 'last' for c in last_cols}})
+    return monthly.to_frame(~np.isnan(monthly.values).any(axis=0))
+
+# Keeps the rows whose 5-year average dollar volume ranks in the top 30% of the month
+def filter_by_dollar_volume(data, number_of_stocks):
+    dates, tickers, date_codes, ticker_codes = panel.frame_codes(data.index)
+    dollar_volume = np.full((len(dates), len(tickers)), np.nan)
+    dollar_volume[date_codes, ticker_codes] = data['dollar_volume'].to_numpy()
 
-    data['dollar_vol_rank'] = (data.groupby('date')['dollar_volume'].rank(ascending=False))
+    dollar_volume = panel.rolling_mean(dollar_volume, 5*12, min_periods=12)
+
+    dollar_vol_rank = panel.cross_sectional_rank(dollar_volume, ascending=False)
 
     number_to_drop = int(number_of_stocks * 0.3)
 
-    data = data[data['dollar_vol_rank']<number_to_drop].drop(['dollar_volume', 'dollar_vol_rank'], axis=1)
+    data = data[dollar_vol_rank[date_codes, ticker_codes] < number_to_drop].drop('dollar_volume', axis=1)
 
     return data
 
+def aggregate_to_monthly(df, number_of_stocks):
+    return filter_by_dollar_volume(resample_to_monthly(df), number_of_stocks)
+
 # 4. Calculate Monthly Returns for different time horizons as features
 def calculate_returns(df):
 
@@ -82,11 +82,11 @@ def calculate_returns(df):
     
     
 # 5. Calculate rolling factor betas
-def calculate_factor_betas(data, start_date):
-    factor_data = web.DataReader('F-F_Research_Data_5_Factors_2x3',
-                               'famafrench',
-                               start=start_date)[0].drop('RF', axis=1)
-    factor_data.index = factor_data.index.to_timestamp()
+def calculate_factor_betas(data, start_date, factor_data=None):
+    if factor_data is None:
+        factor_data = factor_engine.load_factor_data(start_date)
+
+    factor_data = factor_data.drop('RF', axis=1)
 
     factor_data = factor_data.resample('M').last().div(100)
 
@@ -104,26 +104,43 @@ def calculate_factor_betas(data, start_date):
 
     # - Calculate Rolling Factors Betas
 
-    betas = (factor_data.groupby(level=1,
-                                group_keys=False)
-            .apply(lambda x: RollingOLS(endog=x['return_1m'], 
-                                        exog=sm.add_constant(x.drop('return_1m', axis=1)),
-                                        window=min(24, x.shape[0]),
-                                        min_nobs=len(x.columns)+1)
-            .fit(params_only=True)
-            .params
-            .drop('const', axis=1)))
+    betas = factor_engine.rolling_betas(factor_data, endog='return_1m', window=24)
 
     return betas
 
 
-def load_and_create_all_features(tickers, start_date, end_date, number_of_stocks):
-    df = load_stock_data(tickers, start_date, end_date)
-    df = calculate_indicators(df)
-    df = aggregate_to_monthly(df, number_of_stocks)
-    df = df.groupby(level=1, group_keys=False).apply(calculate_returns).dropna()
+def load_and_create_all_features(tickers, start_date, end_date, number_of_stocks, fetcher=None):
+    factor_data = fetcher.submit(factor_engine.load_factor_data, start_date) if fetcher is not None else None
+
+    df = load_monthly_rows(tickers, start_date, end_date, fetcher)
+    df = instrumentation.run('monthly', filter_by_dollar_volume, df, number_of_stocks)
+    return create_monthly_features(df, start_date, factor_data.result() if factor_data is not None else None)
+
+
+# Monthly rows of every ticker before the dollar-volume filter. Everything up to here is
+# per ticker, so with an acquisition.Acquisition every chunk of tickers is requested up
+# front and each chunk's indicators and monthly rows are computed as soon as it arrives.
+def load_monthly_rows(tickers, start_date, end_date, fetcher=None):
+    if fetcher is None:
+        df = instrumentation.run('download', load_stock_data, tickers, start_date, end_date)
+        df = instrumentation.run('indicators', calculate_indicators, df)
+        return instrumentation.run('resample', resample_to_monthly, df)
+
+    chunks = fetcher.submit_chunks(load_stock_data, tickers, start_date, end_date)
+    with instrumentation.stage('chunks') as record:
+        monthly = [resample_to_monthly(calculate_indicators(df)) for df in acquisition.completed(chunks)]
+        df = pd.concat(monthly).sort_index()
+        record['rows'] = len(df)
+    return df
+
+
+# Returns, factor betas and final cleanup on the dollar-volume filtered monthly data
+def create_monthly_features(df, start_date, factor_data=None):
+    with instrumentation.stage('returns') as record:
+        df = df.groupby(level=1, group_keys=False).apply(calculate_returns).dropna()
+        record['rows'] = len(df)
 
-    betas = calculate_factor_betas(df, start_date)
+    betas = instrumentation.run('factor_betas', calculate_factor_betas, df, start_date, factor_data)
     factors = ['Mkt-RF', 'SMB', 'HML', 'RMW', 'CMA']
 
     df = (df.join(betas.groupby('ticker').shift()))
@@ -0,0 +1,190 @@
+import os
+import copy
+import numpy as np
+import pandas as pd
+import feature_creater
+import indicator_engine
+import price_store
+
+INDICATOR_COLUMNS = ['rsi', 'bb_low', 'bb_mid', 'bb_high', 'atr', 'macd']
+LAST_COLUMNS = ['adj close', 'garman_klass_vol'] + INDICATOR_COLUMNS
+SUM_COLUMNS = ['dollar_volume_sum', 'dollar_volume_count']
+PRICE_COLUMNS = ['adj close', 'close']
+
+# Incremental feature pipeline for jobs that rerun on a growing history (e.g. the monthly
+# rebalance). The saved state holds everything the daily stage needs to continue without
+# revisiting old bars:
+#   - the recursive indicator state per ticker (RSI/ATR Wilder averages, MACD EMAs, the
+#     Bollinger window tail and the running ATR/MACD moments used for z-scoring),
+#   - one raw monthly row per ticker and month (dollar-volume sum/count and the month's
+#     last indicator values, ATR/MACD not yet normalised),
+#   - each ticker's last folded date and its adj close/close on that date, to notice a
+#     split or dividend that re-adjusted the history behind the saved state.
+# New daily bars are folded into that state in time proportional to the new data. The
+# monthly stages (dollar-volume window and rank, returns, factor betas) are then rerun
+# from the saved monthly table because their outputs depend on whole-history statistics
+# (return clipping quantiles, beta window and fill); they never touch daily data.
+
+
+def new_feature_state(start_date):
+    monthly = pd.DataFrame(columns=SUM_COLUMNS + LAST_COLUMNS, dtype=float,
+                           index=pd.MultiIndex.from_arrays([pd.DatetimeIndex([]), pd.Index([], dtype=object)], names=['date', 'ticker']))
+    return {
+        'start_date': pd.Timestamp(start_date),
+        'tickers': [],
+        'last_dates': pd.Series(dtype='datetime64[ns]'),
+        'last_prices': pd.DataFrame(columns=PRICE_COLUMNS, dtype=float),
+        'indicators': indicator_engine.new_state(0),
+        'monthly': monthly,
+    }
+
+
+def load_feature_state(path):
+    if not os.path.exists(path):
+        return None
+    return pd.read_pickle(path)
+
+
+def save_feature_state(path, state):
+    price_store.write_atomic(os.path.abspath(path), lambda tmp_path: pd.to_pickle(state, tmp_path))
+
+
+def add_tickers(state, tickers):
+    tickers = [t for t in dict.fromkeys(tickers) if t not in set(state['tickers'])]
+    if tickers:
+        state['tickers'] = state['tickers'] + tickers
+        state['indicators'] = indicator_engine.concat_states(state['indicators'], indicator_engine.new_state(len(tickers)))
+
+
+def drop_tickers(state, tickers):
+    keep = [t for t in state['tickers'] if t not in set(tickers)]
+    state['indicators'] = indicator_engine.take_state(state['indicators'], pd.Index(state['tickers']).get_indexer(keep))
+    state['tickers'] = keep
+    state['monthly'] = state['monthly'][~state['monthly'].index.get_level_values('ticker').isin(tickers)]
+    state['last_dates'] = state['last_dates'].drop(tickers, errors='ignore')
+    state['last_prices'] = state['last_prices'].drop(tickers, errors='ignore')
+
+
+# Tickers whose bar on their last folded date, read again in `daily`, no longer matches the
+# saved one: their history was re-adjusted since (as price_store.adjustment_changed)
+def adjusted_tickers(state, daily):
+    last_bars = pd.MultiIndex.from_arrays([state['last_dates'].to_numpy(), state['last_dates'].index], names=['date', 'ticker'])
+    shared = daily.index.intersection(last_bars)
+    if shared.empty:
+        return []
+    old = state['last_prices'].reindex(shared.get_level_values('ticker'))[PRICE_COLUMNS].to_numpy(dtype=float)
+    fresh = daily.loc[shared, PRICE_COLUMNS].to_numpy(dtype=float)
+    changed = ~np.isclose(old, fresh, rtol=price_store.ADJUSTMENT_TOLERANCE, atol=0) & np.isfinite(old) & np.isfinite(fresh)
+    return shared.get_level_values('ticker')[changed.any(axis=1)].tolist()
+
+
+def aggregate_block_to_monthly(daily):
+    dollar_volume = daily['dollar_volume'].unstack('ticker').resample('M')
+    monthly = pd.concat([
+        dollar_volume.sum(min_count=1).stack('ticker').rename('dollar_volume_sum'),
+        dollar_volume.count().stack('ticker').rename('dollar_volume_count'),
+        daily[LAST_COLUMNS].unstack('ticker').resample('M').last().stack('ticker')
+    ], axis=1)
+    return monthly[monthly['dollar_volume_count'].gt(0) | monthly[LAST_COLUMNS].notna().any(axis=1)]
+
+
+def merge_monthly(old, new):
+    merged = new.combine_first(old)
+    overlap = old.index.intersection(new.index)
+    if len(overlap):
+        sums = old.loc[overlap, SUM_COLUMNS].fillna(0) + new.loc[overlap, SUM_COLUMNS].fillna(0)
+        sums.loc[sums['dollar_volume_count'] == 0, 'dollar_volume_sum'] = np.nan
+        merged.loc[overlap, SUM_COLUMNS] = sums
+    return merged[SUM_COLUMNS + LAST_COLUMNS].sort_index()
+
+
+# Fold a block of new daily bars (load_stock_data layout) into the state
+def advance(state, daily):
+    if daily.empty:
+        return
+
+    rows, cols, block_tickers, shape = indicator_engine.compact_index(daily.index)
+    add_tickers(state, block_tickers)
+    columns = pd.Index(state['tickers']).get_indexer(block_tickers)
+
+    panel = {c: indicator_engine.to_compact(daily[c].to_numpy(dtype=float), rows, cols, shape) for c in ['adj close', 'close', 'high', 'low']}
+    present = indicator_engine.to_compact(1.0, rows, cols, shape) == 1.0
+
+    ticker_state = indicator_engine.take_state(state['indicators'], columns)
+    indicators = indicator_engine.compute_raw_indicators(panel['adj close'], panel['close'], panel['high'], panel['low'], present, ticker_state)
+    indicator_engine.put_state(state['indicators'], columns, ticker_state)
+
+    daily = daily.copy()
+    daily['garman_klass_vol'] = feature_creater.calculate_garman_klass_vol(daily)
+    for name in INDICATOR_COLUMNS:
+        daily[name] = indicators[name][rows, cols]
+    daily['dollar_volume'] = (daily['adj close']*daily['volume'])/1e6
+
+    state['monthly'] = merge_monthly(state['monthly'], aggregate_block_to_monthly(daily))
+
+    last_bars = daily.sort_index().groupby(level='ticker').tail(1).reset_index('date')
+    state['last_dates'] = last_bars['date'].combine_first(state['last_dates'])
+    state['last_prices'] = pd.concat([state['last_prices'].drop(last_bars.index, errors='ignore'), last_bars[PRICE_COLUMNS]])
+
+
+# The monthly table in the layout of feature_creater.resample_to_monthly
+def monthly_data(state, tickers):
+    monthly = state['monthly']
+    monthly = monthly[monthly.index.get_level_values('ticker').isin(tickers)]
+    positions = pd.Index(state['tickers']).get_indexer(monthly.index.get_level_values('ticker'))
+
+    data = monthly[LAST_COLUMNS].copy()
+    for name in ['atr', 'macd']:
+        moments = state['indicators'][f'{name}_moments']
+        data[name] = (data[name] - moments['mean'][positions]) / indicator_engine.moments_std(moments)[positions]
+    data.insert(0, 'dollar_volume', monthly['dollar_volume_sum'] / monthly['dollar_volume_count'])
+    return data.dropna()
+
+
+def concat_blocks(blocks):
+    blocks = [block for block in blocks if not block.empty]
+    return pd.concat(blocks).sort_index() if blocks else pd.DataFrame()
+
+
+def update_features(state_path, tickers, start_date, end_date, number_of_stocks):
+    state = load_feature_state(state_path)
+    if (state is None or 'last_prices' not in state or state['start_date'] != pd.Timestamp(start_date)
+            or (len(state['last_dates']) and state['last_dates'].max() >= pd.Timestamp(end_date))):
+        state = new_feature_state(start_date)
+
+    last_dates = state['last_dates'].reindex(tickers)
+    new_tickers = last_dates.index[last_dates.isna()].tolist()
+    known_tickers = last_dates.index[last_dates.notna()].tolist()
+
+    # Known tickers are read from their own last date on, grouped by that date, so a
+    # stale or delisted ticker doesn't pull the rest of the universe's history back in.
+    # The bar on the last date is read again: if a split or dividend has re-adjusted it
+    # since, the saved indicators and monthly rows are on the old basis and the ticker is
+    # rebuilt from the start date.
+    known = concat_blocks([feature_creater.load_stock_data(group.index.tolist(), last_date, end_date)
+                           for last_date, group in last_dates[known_tickers].groupby(last_dates[known_tickers])])
+    if not known.empty:
+        adjusted = adjusted_tickers(state, known)
+        drop_tickers(state, adjusted)
+        new_tickers += adjusted
+        block_tickers = known.index.get_level_values('ticker')
+        known = known[~block_tickers.isin(adjusted)
+                      & (known.index.get_level_values('date') > last_dates.reindex(block_tickers).to_numpy())]
+
+    blocks = [known]
+    if new_tickers:
+        blocks.append(feature_creater.load_stock_data(new_tickers, start_date, end_date))
+    daily = concat_blocks(blocks)
+
+    # Today's bar is still moving: it is only folded into a throwaway copy of the state
+    today = pd.Timestamp.today().normalize()
+    dates = daily.index.get_level_values('date') if not daily.empty else pd.DatetimeIndex([])
+    advance(state, daily[dates < today])
+    save_feature_state(state_path, state)
+
+    if (dates >= today).any():
+        state = copy.deepcopy(state)
+        advance(state, daily[dates >= today])
+
+    data = feature_creater.filter_by_dollar_volume(monthly_data(state, tickers), number_of_stocks)
+    return feature_creater.create_monthly_features(data, state['start_date'])
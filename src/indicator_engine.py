@@ -0,0 +1,329 @@
+import numpy as np
+from scipy.signal import lfilter
+
+# Indicators are computed on "compacted" dates x tickers panels: column j holds ticker j's
+# observations in date order starting at row 0 and is NaN-padded at the bottom. Rolling
+# windows and recursive averages then run over each ticker's own observations, exactly
+# like a per-ticker groupby, but for all tickers in a single vectorized pass.
+#
+# Every recursive computation can also carry its state across calls: pass the same
+# `state` dict for consecutive blocks of new observations and the outputs continue
+# exactly where the previous block stopped. States hold one value per ticker column.
+
+
+def compact_index(index):
+    date_codes = index.get_level_values(0).values.astype('datetime64[ns]').view('int64')
+    ticker_codes, tickers = index.get_level_values(1).factorize()
+
+    order = np.lexsort((date_codes, ticker_codes))
+    sorted_codes = ticker_codes[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_codes)) + 1]
+    counts = np.diff(np.r_[starts, len(order)])
+
+    rows = np.empty(len(order), dtype=np.int64)
+    rows[order] = np.arange(len(order)) - np.repeat(starts, counts)
+
+    shape = (int(counts.max()) if len(counts) else 0, len(tickers))
+    return rows, ticker_codes, tickers, shape
+
+
+def to_compact(values, rows, cols, shape):
+    panel = np.full(shape, np.nan)
+    panel[rows, cols] = values
+    return panel
+
+
+def first_valid_rows(x):
+    valid = ~np.isnan(x)
+    return np.where(valid.any(axis=0), valid.argmax(axis=0), x.shape[0])
+
+
+def present_counts(x, counts):
+    return np.full(x.shape[1], x.shape[0]) if counts is None else counts
+
+
+# Value of each column at its last present row, or `default` where the block has none
+def last_present(x, counts, default):
+    if not x.shape[0]:
+        return default
+    return np.where(counts > 0, x[np.maximum(counts - 1, 0), np.arange(x.shape[1])], default)
+
+
+# Matches pandas' Series.ewm(alpha=alpha, adjust=adjust, min_periods=min_periods).mean()
+def ewm_mean(x, alpha, adjust=True, min_periods=0, state=None, counts=None):
+    state = {} if state is None else state
+    counts = present_counts(x, counts)
+    state.setdefault('nobs', np.zeros(x.shape[1]))
+
+    valid = ~np.isnan(x)
+    nobs = state['nobs'] + np.cumsum(valid, axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if adjust:
+            out = ewm_mean_adjusted(x, valid, alpha, state, counts)
+        else:
+            out = ewm_mean_unadjusted(x, valid, alpha, state, counts)
+
+    state['nobs'] = last_present(nobs, counts, state['nobs'])
+    out[nobs < max(min_periods, 1)] = np.nan
+    return out
+
+
+# The adjusted average is a ratio of two linear recurrences (weighted sum and sum of weights)
+def ewm_mean_adjusted(x, valid, alpha, state, counts):
+    decay = 1.0 - alpha
+    state.setdefault('num', np.zeros(x.shape[1]))
+    state.setdefault('den', np.zeros(x.shape[1]))
+    if not x.shape[0]:
+        return np.empty(x.shape)
+
+    num, _ = lfilter([1.0], [1.0, -decay], np.where(valid, x, 0.0), axis=0, zi=decay * state['num'][None, :])
+    den, _ = lfilter([1.0], [1.0, -decay], valid.astype(float), axis=0, zi=decay * state['den'][None, :])
+
+    state['num'] = last_present(num, counts, state['num'])
+    state['den'] = last_present(den, counts, state['den'])
+    return num / den
+
+
+def ewm_mean_unadjusted(x, valid, alpha, state, counts):
+    decay = 1.0 - alpha
+    n_rows, n_columns = x.shape
+    state.setdefault('weighted', np.full(n_columns, np.nan))
+    state.setdefault('old_wt', np.ones(n_columns))
+    if not n_rows:
+        return np.empty(x.shape)
+
+    row = np.arange(n_rows)[:, None]
+    started = ~np.isnan(state['weighted'])
+    first = np.where(started, 0, first_valid_rows(x))
+    gapped = ((row >= first) & (row < counts) & ~valid).any(axis=0) | (started & (state['old_wt'] != 1.0))
+
+    # Gap-free columns are the plain linear recurrence y[t] = (1-alpha)*y[t-1] + alpha*x[t]
+    # seeded with the first observation
+    filled = np.where(valid, x, 0.0)
+    inputs = alpha * filled
+    seeding = np.flatnonzero(~started & (first < n_rows))
+    inputs[first[seeding], seeding] = filled[first[seeding], seeding]
+    out, _ = lfilter([1.0], [1.0, -decay], inputs, axis=0, zi=decay * np.where(started, state['weighted'], 0.0)[None, :])
+    out = np.where(row >= first, out, np.nan)
+    weighted = np.where(counts > first, last_present(out, counts, np.nan), state['weighted'])
+    old_wt = state['old_wt'].copy()
+
+    # Columns with interior NaNs follow pandas' reweighting across the gaps
+    columns = np.flatnonzero(gapped)
+    if len(columns):
+        column_weighted = state['weighted'][columns].copy()
+        column_old_wt = state['old_wt'][columns].copy()
+        for i in range(n_rows):
+            is_present = i < counts[columns]
+            cur = x[i, columns]
+            is_obs = valid[i, columns] & is_present
+            has_weighted = ~np.isnan(column_weighted)
+            column_old_wt = np.where(has_weighted & is_present, column_old_wt * decay, column_old_wt)
+            blended = (column_old_wt * column_weighted + alpha * cur) / (column_old_wt + alpha)
+            column_weighted = np.where(is_obs, np.where(has_weighted, blended, cur), column_weighted)
+            column_old_wt = np.where(is_obs, 1.0, column_old_wt)
+            out[i, columns] = column_weighted
+        weighted[columns] = column_weighted
+        old_wt[columns] = column_old_wt
+
+    state['weighted'] = weighted
+    state['old_wt'] = old_wt
+    return out
+
+
+# Matches pandas' rolling(window).mean() / .std(ddof=ddof) with min_periods=window.
+# The state keeps the last window-1 observations of each column.
+def rolling_mean_std(x, window, ddof=0, state=None, counts=None):
+    state = {} if state is None else state
+    counts = present_counts(x, counts)
+    tail = state.setdefault('tail', np.full((window - 1, x.shape[1]), np.nan))
+    extended = np.vstack([tail, x])
+    valid = ~np.isnan(extended)
+
+    # Shift each column by its first observation to keep the running sums well conditioned
+    first = np.minimum(first_valid_rows(extended), len(extended) - 1)
+    shift = extended[first, np.arange(x.shape[1])] if len(extended) else np.zeros(x.shape[1])
+    shift = np.where(np.isnan(shift), 0.0, shift)
+    y = np.where(valid, extended - shift, 0.0)
+
+    def window_sum(a):
+        c = np.cumsum(np.vstack([np.zeros((1, a.shape[1])), a]), axis=0)
+        return c[window:] - c[:-window]
+
+    n = window_sum(valid.astype(float))
+    s1 = window_sum(y)
+    s2 = window_sum(y * y)
+
+    full = n == window
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(full, s1 / window + shift, np.nan)
+        var = np.where(full, (s2 - s1 * s1 / window) / (window - ddof), np.nan)
+
+    state['tail'] = extended[counts[None, :] + np.arange(window - 1)[:, None], np.arange(x.shape[1])]
+    return mean, np.sqrt(np.maximum(var, 0.0))
+
+
+# x shifted down one row, continuing from the previous block's last observation
+def lagged(x, state=None, counts=None):
+    state = {} if state is None else state
+    counts = present_counts(x, counts)
+    prev = state.setdefault('prev', np.full(x.shape[1], np.nan))
+    out = np.vstack([prev[None, :], x[:-1]])[:x.shape[0]]
+    state['prev'] = last_present(x, counts, prev)
+    return out
+
+
+def nan_mean(x):
+    count = (~np.isnan(x)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, np.nansum(x, axis=0) / count, np.nan)
+
+
+def zscore(x):
+    count = (~np.isnan(x)).sum(axis=0)
+    mean = nan_mean(x)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(np.nansum((x - mean) ** 2, axis=0) / (count - 1))
+        return (x - mean) / np.where(count > 1, std, np.nan)
+
+
+# Running count / mean / sum of squared deviations of each column (pairwise merge),
+# enough to z-score a history that arrived in blocks
+def update_moments(x, state):
+    count = state.setdefault('count', np.zeros(x.shape[1]))
+    mean = state.setdefault('mean', np.zeros(x.shape[1]))
+    m2 = state.setdefault('m2', np.zeros(x.shape[1]))
+
+    block_count = (~np.isnan(x)).sum(axis=0)
+    block_mean = np.where(block_count > 0, nan_mean(x), 0.0)
+    block_m2 = np.nansum((x - block_mean) ** 2, axis=0)
+
+    total = count + block_count
+    delta = block_mean - mean
+    with np.errstate(invalid='ignore', divide='ignore'):
+        state['mean'] = np.where(total > 0, mean + delta * block_count / total, 0.0)
+        state['m2'] = np.where(total > 0, m2 + block_m2 + delta ** 2 * count * block_count / total, 0.0)
+    state['count'] = total
+
+
+def moments_std(state):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(state['count'] > 1, np.sqrt(state['m2'] / (state['count'] - 1)), np.nan)
+
+
+# pandas_ta.rsi
+def rsi(close, length=20, state=None, counts=None):
+    state = {} if state is None else state
+    change = close - lagged(close, state.setdefault('lag', {}), counts)
+    positive = np.where(change < 0, 0.0, change)
+    negative = np.where(change > 0, 0.0, change)
+
+    positive_avg = ewm_mean(positive, 1.0 / length, min_periods=length, state=state.setdefault('positive', {}), counts=counts)
+    negative_avg = ewm_mean(negative, 1.0 / length, min_periods=length, state=state.setdefault('negative', {}), counts=counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return 100 * positive_avg / (positive_avg + np.abs(negative_avg))
+
+
+# pandas_ta.bbands -> (lower, mid, upper)
+def bbands(close, length=20, std=2.0, state=None, counts=None):
+    mid, deviation = rolling_mean_std(close, length, ddof=0, state=state, counts=counts)
+    return mid - std * deviation, mid, mid + std * deviation
+
+
+# pandas_ta.atr (RMA of the true range, the very first row is undefined)
+def atr(high, low, close, length=14, state=None, counts=None):
+    state = {} if state is None else state
+    counts = present_counts(close, counts)
+    seen = state.setdefault('rows', np.zeros(close.shape[1]))
+
+    prev_close = lagged(close, state.setdefault('lag', {}), counts)
+    true_range = np.fmax(np.fmax(np.abs(high - low), np.abs(high - prev_close)), np.abs(prev_close - low))
+    if close.shape[0]:
+        true_range[0, seen == 0] = np.nan
+    state['rows'] = seen + counts
+    return ewm_mean(true_range, 1.0 / length, min_periods=length, state=state.setdefault('rma', {}), counts=counts)
+
+
+# pandas_ta.ema: seeded with the SMA of the first `length` observations
+def ema(close, length, state=None, counts=None):
+    state = {} if state is None else state
+    counts = present_counts(close, counts)
+    n_columns = close.shape[1]
+    seen = state.setdefault('rows', np.zeros(n_columns))
+    seed_sum = state.setdefault('seed_sum', np.zeros(n_columns))
+    seed_count = state.setdefault('seed_count', np.zeros(n_columns))
+
+    row = seen + np.arange(close.shape[0])[:, None]
+    seeding = (row < length) & (np.arange(close.shape[0])[:, None] < counts) & ~np.isnan(close)
+    sums = seed_sum + np.cumsum(np.where(seeding, close, 0.0), axis=0)
+    sum_counts = seed_count + np.cumsum(seeding, axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        seed = sums / np.where(sum_counts > 0, sum_counts, np.nan)
+    seeded = np.where(row < length - 1, np.nan, np.where(row == length - 1, seed, close))
+
+    state['seed_sum'] = last_present(sums, counts, seed_sum)
+    state['seed_count'] = last_present(sum_counts, counts, seed_count)
+    state['rows'] = seen + counts
+    return ewm_mean(seeded, 2.0 / (length + 1), adjust=False, state=state.setdefault('ewm', {}), counts=counts)
+
+
+# MACD line of pandas_ta.macd
+def macd(close, fast=12, slow=26, state=None, counts=None):
+    state = {} if state is None else state
+    return ema(close, fast, state.setdefault('fast', {}), counts) - ema(close, slow, state.setdefault('slow', {}), counts)
+
+
+# `present` marks the rows of the compacted panel that hold an observation; recursive
+# averages carry their last value into the NaN padding, which must not leak into outputs.
+# ATR and MACD are returned un-normalised, with their running moments kept in the state.
+def compute_raw_indicators(adj_close, close, high, low, present, state):
+    counts = present.sum(axis=0)
+
+    def observed(x):
+        return np.where(present, x, np.nan)
+
+    bb_low, bb_mid, bb_high = bbands(np.log1p(adj_close), length=20, state=state.setdefault('bbands', {}), counts=counts)
+    indicators = {
+        'rsi': observed(rsi(adj_close, length=20, state=state.setdefault('rsi', {}), counts=counts)),
+        'bb_low': observed(bb_low),
+        'bb_mid': observed(bb_mid),
+        'bb_high': observed(bb_high),
+        'atr': observed(atr(high, low, close, length=14, state=state.setdefault('atr', {}), counts=counts)),
+        'macd': observed(macd(adj_close, state=state.setdefault('macd', {}), counts=counts)),
+    }
+    update_moments(indicators['atr'], state.setdefault('atr_moments', {}))
+    update_moments(indicators['macd'], state.setdefault('macd_moments', {}))
+    return indicators
+
+
+def compute_indicators(adj_close, close, high, low, present):
+    indicators = compute_raw_indicators(adj_close, close, high, low, present, state={})
+    indicators['atr'] = zscore(indicators['atr'])
+    indicators['macd'] = zscore(indicators['macd'])
+    return indicators
+
+
+# States are nested dicts of arrays whose last axis is the ticker column
+def new_state(n_tickers):
+    state = {}
+    empty = np.empty((0, n_tickers))
+    compute_raw_indicators(empty, empty, empty, empty, np.zeros((0, n_tickers), dtype=bool), state)
+    return state
+
+
+def take_state(state, columns):
+    return {k: take_state(v, columns) if isinstance(v, dict) else v[..., columns] for k, v in state.items()}
+
+
+def put_state(state, columns, values):
+    for k, v in values.items():
+        if isinstance(v, dict):
+            put_state(state[k], columns, v)
+        else:
+            state[k][..., columns] = v
+
+
+def concat_states(a, b):
+    return {k: concat_states(v, b[k]) if isinstance(v, dict) else np.concatenate([v, b[k]], axis=-1) for k, v in a.items()}
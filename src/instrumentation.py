@@ -0,0 +1,191 @@
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+# Per-stage measurements of a pipeline run. Pipeline functions wrap their stages in
+# `stage(name)` / `run(name, func, ...)`; while a Recorder is active (`recording`), each
+# stage gets its wall time, CPU time, peak traced memory, output row count and error,
+# nested stages are named 'parent/child', and the rebalance scheduler adds one record
+# per month (solve time, tickers, solver failure). Without an active Recorder the hooks
+# only call through.
+#
+# The active Recorder is context-local, so concurrent runs (Streamlit sessions are
+# threads of one process) each record into their own. They share one tracemalloc
+# session, started by the first and stopped by the last Recorder that traces, and peak
+# memory is process-wide: concurrent runs count towards each other's peaks.
+#
+# cProfile only covers the thread that enables it (the one running the pipeline, not the
+# acquisition threads or the optimization worker processes), and Python 3.12+ allows one
+# active profiler per process, so one Recorder profiles at a time; a run that asks for a
+# profile while another is being profiled goes without and says so in its report.
+
+_active = contextvars.ContextVar('instrumentation_recorder', default=None)
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_owns_tracing = False
+_open_records = []
+
+_profiling_lock = threading.Lock()
+
+
+def acquire_tracing():
+    global _tracing_users, _owns_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owns_tracing = True
+        _tracing_users += 1
+
+
+def release_tracing():
+    global _tracing_users, _owns_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _owns_tracing:
+            tracemalloc.stop()
+            _owns_tracing = False
+
+
+# Folds the traced peak since the last reset into every open stage of every Recorder,
+# then resets it. `opened`/`closed` is a stage record to add to or drop from the open set.
+def fold_peak(opened=None, closed=None):
+    with _tracing_lock:
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+        for record in _open_records:
+            record['peak_bytes'] = max(record['peak_bytes'], peak)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        if opened is not None:
+            _open_records.append(opened)
+        if closed is not None:
+            del _open_records[next(i for i, r in enumerate(_open_records) if r is closed)]
+
+
+class Recorder:
+    def __init__(self, trace_memory=True, profile=False):
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.profiler = None
+        self.profiling = False
+        self.profile_error = None
+        self.started = None
+        self.stages = []
+        self.months = []
+        self.open = []
+
+    def start(self):
+        self.started = pd.Timestamp.now()
+        if self.trace_memory:
+            acquire_tracing()
+        if self.profile:
+            self.start_profiler()
+
+    def start_profiler(self):
+        if not _profiling_lock.acquire(blocking=False):
+            self.profile_error = 'Not profiled: another run was being profiled.'
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except Exception as e:
+            # e.g. a debugger or coverage tool already holds the profiling hook
+            _profiling_lock.release()
+            self.profile_error = f'Not profiled: {e}'
+            return
+        self.profiler, self.profiling = profiler, True
+
+    def stop(self):
+        if self.profiling:
+            self.profiler.disable()
+            self.profiling = False
+            _profiling_lock.release()
+        if self.trace_memory:
+            release_tracing()
+
+    @contextmanager
+    def stage(self, name):
+        record = {'stage': f'{self.open[-1]["stage"]}/{name}' if self.open else name}
+        if self.trace_memory:
+            record['peak_bytes'] = 0
+            fold_peak(opened=record)
+        self.open.append(record)
+        self.stages.append(record)
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            record['seconds'] = time.perf_counter() - wall
+            record['cpu_seconds'] = time.process_time() - cpu
+            self.open.pop()
+            if self.trace_memory:
+                fold_peak(closed=record)
+
+    def profile_stats(self, limit=30):
+        if self.profiler is None:
+            return self.profile_error
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+    def to_dict(self):
+        return {'started': self.started.isoformat(timespec='seconds') if self.started is not None else None,
+                'stages': self.stages,
+                'months': self.months,
+                'solver_failures': sum(1 for m in self.months if m.get('failure')),
+                'profile': self.profile_stats()}
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), default=str, **kwargs)
+
+
+@contextmanager
+def recording(recorder):
+    recorder.start()
+    token = _active.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _active.reset(token)
+        recorder.stop()
+
+
+def active():
+    return _active.get()
+
+
+@contextmanager
+def stage(name):
+    recorder = active()
+    if recorder is None:
+        yield {}
+    else:
+        with recorder.stage(name) as record:
+            yield record
+
+
+# func(*args, **kwargs) as a stage, with the result's length as its row count
+def run(name, func, *args, **kwargs):
+    with stage(name) as record:
+        value = func(*args, **kwargs)
+        if hasattr(value, '__len__'):
+            record['rows'] = len(value)
+    return value
+
+
+# Month records from the rebalance scheduler: dicts with date, seconds, tickers, failure
+def record_months(months):
+    recorder = active()
+    if recorder is not None:
+        recorder.months.extend(months)
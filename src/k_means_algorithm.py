@@ -1,24 +1,130 @@
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
 import streamlit as st
 
 TARGET_RSI_VALUES = [30, 45, 55, 75]
-NUM_CLUSTERS = 4
-INITIAL_CENTROIDS = np.zeros((len(TARGET_RSI_VALUES), 18))
 
-# Set initial centroids based on target RSI values
-INITIAL_CENTROIDS[:, 1] = TARGET_RSI_VALUES
+# Lloyd's iterations stop like sklearn's KMeans: labels unchanged, or the total squared
+# centroid shift below TOL times the month's mean feature variance
+MAX_ITER = 300
+TOL = 1e-4
 
 
-def get_clusters(df):
-    df['cluster'] = KMeans(n_clusters=NUM_CLUSTERS,
-                           random_state=0,
-                           init=INITIAL_CENTROIDS).fit(df).labels_
-    return df
+# Initial centroids sit at the target RSI values with every other feature at zero; there
+# is one cluster per target
+def initial_centroids(columns, target_rsi_values=TARGET_RSI_VALUES):
+    centroids = np.zeros((len(target_rsi_values), len(columns)))
+    centroids[:, list(columns).index('rsi')] = target_rsi_values
+    return centroids
+
+
+# Stacks the monthly cross-sections into a (months x stocks x features) array, each
+# month's stocks from slot 0 and zero-padded; `mask` marks the real rows
+def stack_months(df):
+    month_codes, months = pd.factorize(df.index.get_level_values('date'), sort=True)
+    counts = np.bincount(month_codes, minlength=len(months))
+    order = np.argsort(month_codes, kind='stable')
+
+    slots = np.empty(len(order), dtype=np.int64)
+    slots[order] = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    X = np.zeros((len(months), counts.max() if len(counts) else 0, df.shape[1]))
+    X[month_codes, slots] = df.to_numpy(dtype=float)
+    mask = np.zeros(X.shape[:2], dtype=bool)
+    mask[month_codes, slots] = True
+    return X, mask, month_codes, slots
+
+
+# Lloyd's algorithm for every month at once, following sklearn's KMeans(init=centroids,
+# n_init=1): same stopping rule, same relocation of empty clusters to the points farthest
+# from their centroid, same final reassignment. Months stop iterating independently.
+def lloyd(X, mask, centroids, max_iter=MAX_ITER, tol=TOL):
+    n_months, n_slots, _ = X.shape
+    n_clusters = centroids.shape[1]
+    weights = mask[..., None]
+
+    n_stocks = mask.sum(axis=1)[:, None]
+    mean = (X * weights).sum(axis=1) / n_stocks
+    tol = tol * ((((X - mean[:, None]) ** 2) * weights).sum(axis=1) / n_stocks).mean(axis=1)
+
+    centroids = np.array(centroids, dtype=float)
+    labels = np.full((n_months, n_slots), -1)
+    strict = np.zeros(n_months, dtype=bool)
+    active = np.ones(n_months, dtype=bool)
+
+    for _ in range(max_iter):
+        months = np.flatnonzero(active)
+        if not len(months):
+            break
+
+        x, m, old = X[months], mask[months], centroids[months]
+        distances = ((x[:, :, None] - old[:, None]) ** 2).sum(axis=-1)
+        new_labels = distances.argmin(axis=-1)
+
+        members = (new_labels[..., None] == np.arange(n_clusters)) & m[..., None]
+        sums = members.transpose(0, 2, 1).astype(float) @ x
+        sizes = members.sum(axis=1).astype(float)
+
+        for i in np.flatnonzero((sizes == 0).any(axis=1)):
+            relocate_empty_clusters(x[i], m[i], old[i], new_labels[i], distances[i], sums[i], sizes[i])
 
-def run_k_means_algorithm(df):
-    return df.dropna().groupby('date', group_keys=False).apply(get_clusters)
+        new = np.where(sizes[..., None] > 0, sums / np.maximum(sizes, 1)[..., None], old)
+        unchanged = ((new_labels == labels[months]) | ~m).all(axis=1)
+        shift = ((new - old) ** 2).sum(axis=(1, 2))
+
+        centroids[months] = new
+        labels[months] = new_labels
+        strict[months] = unchanged
+        active[months] = ~(unchanged | (shift <= tol[months]))
+
+    # Months that stopped on the tolerance get labels matching their final centroids
+    final = ~strict
+    if final.any():
+        distances = ((X[final][:, :, None] - centroids[final][:, None]) ** 2).sum(axis=-1)
+        labels[final] = distances.argmin(axis=-1)
+
+    return np.where(mask, labels, -1), centroids
+
+
+def relocate_empty_clusters(x, mask, centroids, labels, distances, sums, sizes):
+    empty = np.flatnonzero(sizes == 0)
+    own_distance = np.where(mask, distances[np.arange(len(labels)), labels], -np.inf)
+    farthest = np.argsort(-own_distance, kind='stable')[:min(len(empty), mask.sum())]
+
+    for cluster, point in zip(empty, farthest):
+        sums[labels[point]] -= x[point]
+        sizes[labels[point]] -= 1
+        sums[cluster] = x[point]
+        sizes[cluster] = 1
+
+
+# Clusters every month of `X`. With warm_start each month starts from the previous
+# month's final centroids (so it runs month by month); otherwise all months start from
+# `init` and run as one batch.
+def cluster_months(X, mask, init, warm_start=False):
+    if not warm_start:
+        return lloyd(X, mask, np.broadcast_to(init, (X.shape[0],) + init.shape))
+
+    labels = np.full(mask.shape, -1)
+    centroids = np.empty((X.shape[0],) + init.shape)
+    previous = init
+    for i in range(X.shape[0]):
+        month_labels, month_centroids = lloyd(X[i:i + 1], mask[i:i + 1], previous[None])
+        labels[i], centroids[i] = month_labels[0], month_centroids[0]
+        previous = centroids[i]
+    return labels, centroids
+
+
+def run_k_means_algorithm(df, warm_start=False, target_rsi_values=TARGET_RSI_VALUES):
+    df = df.dropna().copy()
+    if df.empty:
+        return df.assign(cluster=pd.Series(dtype=int))
+
+    X, mask, month_codes, slots = stack_months(df)
+    labels, _ = cluster_months(X, mask, initial_centroids(df.columns, target_rsi_values), warm_start)
+    df['cluster'] = labels[month_codes, slots]
+    return df
 
 def plot_clusters(data):
     plt.clf()
@@ -0,0 +1,238 @@
+import numpy as np
+from collections import OrderedDict
+
+# Long-only, box-constrained maximum Sharpe ratio portfolio:
+#     max (mu - rf)'w / sqrt(w' S w)   s.t.  sum(w) = 1,  lower <= w <= upper
+# solved through the Charnes-Cooper reformulation pypfopt uses, with y = w / (mu - rf)'w:
+#     min y' S y   s.t.  (mu - rf)'y = 1,  lower * sum(y) <= y <= upper * sum(y)
+# The reformulated problem is a small convex QP with homogeneous inequality constraints.
+# It is solved by a primal-dual active-set iteration on which assets sit on a bound,
+# falling back to a primal active-set method (which cannot cycle) when that fails.
+# Starting from the previous month's weights usually leaves few statuses to change.
+
+TOLERANCE = 1e-10
+KKT_TOLERANCE = 1e-8
+MAX_ITERATIONS_PER_ASSET = 20
+
+
+class SolverError(Exception):
+    pass
+
+
+# The problem is feasible but the iterations did not reach its optimum
+class ConvergenceError(SolverError):
+    pass
+
+
+# Euclidean projection onto {sum(w) = 1, lower <= w <= upper}: sum(clip(w - t)) is
+# piecewise linear in the shift t, with breakpoints where an asset reaches a bound
+def project_to_box_simplex(w, lower, upper):
+    shifts = np.sort(np.concatenate([w - lower, w - upper]))
+    sums = np.clip(w[None, :] - shifts[:, None], lower, upper).sum(axis=1)
+    k = int(np.searchsorted(-sums, -1.0))
+    if k == 0 or k == len(shifts):
+        return np.clip(w - shifts[min(k, len(shifts) - 1)], lower, upper)
+    gap = sums[k - 1] - sums[k]
+    shift = shifts[k - 1] + (0.0 if gap <= 0 else (sums[k - 1] - 1) / gap * (shifts[k] - shifts[k - 1]))
+    return np.clip(w - shift, lower, upper)
+
+
+# Feasible weights with the highest expected excess return: everything at the lower
+# bound, then the best assets filled up to the upper bound
+def best_return_point(excess, lower, upper):
+    w = np.full(len(excess), lower, dtype=float)
+    remaining = 1 - w.sum()
+    for i in np.argsort(-excess, kind='stable'):
+        step = min(upper - lower, remaining)
+        w[i] += step
+        remaining -= step
+        if remaining <= 0:
+            break
+    return w
+
+
+# First feasible point with a positive excess return among: `initial_weights` (last
+# month's weights) when given, the unconstrained tangency portfolio projected onto the
+# bounds, equal weights and the highest-return corner
+def starting_point(excess, cov, lower, upper, initial_weights):
+    n = len(excess)
+    if initial_weights is not None:
+        w = project_to_box_simplex(np.asarray(initial_weights, dtype=float), lower, upper)
+        if excess @ w > TOLERANCE:
+            return w
+    try:
+        tangency = np.linalg.solve(cov, excess)
+        if tangency.sum() > 0:
+            w = project_to_box_simplex(tangency / tangency.sum(), lower, upper)
+            if excess @ w > TOLERANCE:
+                return w
+    except np.linalg.LinAlgError:
+        pass
+    if lower <= 1 / n <= upper and excess.mean() > TOLERANCE:
+        return np.full(n, 1 / n)
+    w = best_return_point(excess, lower, upper)
+    if excess @ w > TOLERANCE:
+        return w
+    raise SolverError('at least one of the assets must have an expected return exceeding the risk-free rate')
+
+
+# Both solvers below work on  min y'Sy  s.t.  a'y = 1,  lower * sum(y) <= y <= upper * sum(y)
+# with a status per asset (free, at lower, at upper). A bound asset has y_i = bound * s
+# with s = sum(y), so each equality-constrained subproblem only has the free assets and
+# s as unknowns.
+FREE, LOWER, UPPER = 0, 1, 2
+
+
+def bound_status(y, lower, upper):
+    s = y.sum()
+    status = np.full(len(y), FREE)
+    status[y <= lower * s + TOLERANCE * s] = LOWER
+    status[y >= upper * s - TOLERANCE * s] = UPPER
+    if (status != FREE).all():
+        # With every asset on a bound the last bound follows from the others
+        status[-1] = FREE
+    return status
+
+
+# Minimiser of the subproblem with every bound asset held on its bound, or None when
+# the subproblem has none
+def subproblem(S, a, status, lower, upper):
+    free = np.flatnonzero(status == FREE)
+    bound = np.flatnonzero(status != FREE)
+    c = np.where(status[bound] == LOWER, lower, upper)
+
+    # y = P z with z = (y_free, s): minimise z'P'SPz s.t. a'Pz = 1, sum(Pz) = s
+    f = len(free)
+    S_c = S[:, bound] @ c
+    kkt = np.zeros((f + 3, f + 3))
+    kkt[:f, :f] = 2 * S[free][:, free]
+    kkt[:f, f] = kkt[f, :f] = 2 * S_c[free]
+    kkt[f, f] = 2 * c @ S_c[bound]
+    constraints = kkt[f + 1:, :f + 1]
+    constraints[0, :f], constraints[0, f] = a[free], a[bound] @ c
+    constraints[1, :f], constraints[1, f] = 1.0, c.sum() - 1
+    kkt[:f + 1, f + 1:] = -constraints.T
+    rhs = np.zeros(f + 3)
+    rhs[f + 1] = 1.0
+    try:
+        z = np.linalg.solve(kkt, rhs)
+    except np.linalg.LinAlgError:
+        z = None
+    if z is None or not np.allclose(kkt @ z, rhs, atol=KKT_TOLERANCE):
+        # A singular but valid covariance (duplicate or zero-variance assets) leaves the
+        # subproblem with a set of minimisers; take the least-squares one
+        z = np.linalg.lstsq(kkt, rhs, rcond=None)[0]
+        if not np.allclose(kkt @ z, rhs, atol=KKT_TOLERANCE):
+            return None
+
+    y = np.empty(len(status))
+    y[free], y[bound] = z[:f], c * z[f]
+    return y
+
+
+# Multipliers of the bounds held in `status` at a subproblem minimiser y, from
+# 2Sy = mu a + nu + lambda (lower) or mu a + nu - lambda (upper) with mu = 2y'Sy;
+# free assets get +inf. Also returns the tolerance below which a multiplier is negative.
+def bound_multipliers(S, a, y, status):
+    gradient = 2 * S @ y
+    mu = y @ gradient
+    free = status == FREE
+    nu = (gradient[free] - mu * a[free]).mean()
+    multipliers = np.where(status == LOWER, 1, -1) * (gradient - mu * a - nu)
+    multipliers[free] = np.inf
+    return multipliers, TOLERANCE * max(1, np.abs(gradient).max())
+
+
+# Primal-dual active set: solve the subproblem for the current statuses, then move free
+# assets that broke a bound onto it and release bound assets with negative multipliers,
+# until nothing changes. Usually a handful of iterations from a reasonable guess, but
+# without a convergence guarantee: returns None when it cycles.
+def solve_primal_dual(S, a, status, lower, upper):
+    seen = set()
+    while status.tobytes() not in seen:
+        seen.add(status.tobytes())
+        y = subproblem(S, a, status, lower, upper)
+        if y is None:
+            return None
+        s = y.sum()
+        if s <= 0:
+            return None
+
+        multipliers, tolerance = bound_multipliers(S, a, y, status)
+        new_status = status.copy()
+        new_status[multipliers < -tolerance] = FREE
+        free = status == FREE
+        new_status[free & (y < lower * s - TOLERANCE * s)] = LOWER
+        new_status[free & (y > upper * s + TOLERANCE * s)] = UPPER
+        if (new_status != FREE).all():
+            new_status[int(np.argmin(np.where(status == FREE, np.inf, multipliers)))] = FREE
+
+        if (new_status == status).all():
+            return y
+        status = new_status
+    return None
+
+
+# Primal active-set method from a feasible y: guaranteed to converge, one status change
+# per iteration
+def solve_active_set(S, a, y, lower, upper):
+    status = bound_status(y, lower, upper)
+
+    for _ in range(MAX_ITERATIONS_PER_ASSET * len(y)):
+        target = subproblem(S, a, status, lower, upper)
+        if target is None:
+            break
+        p = target - y
+
+        if np.abs(p).max() <= TOLERANCE * max(1, np.abs(y).max()):
+            multipliers, tolerance = bound_multipliers(S, a, y, status)
+            worst = int(multipliers.argmin())
+            if multipliers[worst] >= -tolerance:
+                return y
+            status[worst] = FREE
+            continue
+
+        # Step towards the subproblem minimum until a free asset reaches a bound
+        free = np.flatnonzero(status == FREE)
+        f, s, ps = len(free), y.sum(), p.sum()
+        slopes = np.concatenate([p[free] - lower * ps, upper * ps - p[free]])
+        slacks = np.maximum(np.concatenate([y[free] - lower * s, upper * s - y[free]]), 0.0)
+        decreasing = slopes < -TOLERANCE * np.maximum(1, np.abs(np.tile(p[free], 2)))
+        limits = np.where(decreasing, slacks / np.where(decreasing, -slopes, 1.0), np.inf)
+
+        first = int(limits.argmin())
+        step = min(1.0, limits[first])
+        y = y + step * p
+        if step < 1.0:
+            blocked = free[first % f]
+            status[blocked] = LOWER if first < f else UPPER
+            y[blocked] = (lower if first < f else upper) * y.sum()
+
+    raise ConvergenceError('active-set iterations did not converge')
+
+
+# Max Sharpe weights as an array aligned with `mu`
+def max_sharpe_weights(mu, cov, lower_bound=0.0, upper_bound=1.0, risk_free_rate=0.0, initial_weights=None):
+    mu = np.asarray(mu, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+    n = len(mu)
+    if not (np.isfinite(mu).all() and np.isfinite(cov).all()):
+        raise SolverError('expected returns and covariance must be finite')
+    if n * lower_bound > 1 or n * upper_bound < 1:
+        raise SolverError('weight bounds are infeasible')
+
+    excess = mu - risk_free_rate
+    w = starting_point(excess, cov, lower_bound, upper_bound, initial_weights)
+    y = w / (excess @ w)
+
+    solution = solve_primal_dual(cov, excess, bound_status(y, lower_bound, upper_bound), lower_bound, upper_bound)
+    if solution is None:
+        solution = solve_active_set(cov, excess, y, lower_bound, upper_bound)
+    return solution / solution.sum()
+
+
+# Same cleaning as pypfopt's clean_weights: tiny weights zeroed, then rounded
+def clean_weights(tickers, weights, cutoff=1e-4, rounding=5):
+    weights = np.where(np.abs(weights) < cutoff, 0, weights)
+    weights = np.round(weights, rounding) + 0.0
+    return OrderedDict(zip(tickers, weights))
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+# Summary statistics of a daily strategy return series, compounded the same way as the
+# performance graph (portfolio_optimization.draw_graph)
+
+TRADING_DAYS = 252
+
+
+def cumulative_growth(returns):
+    return np.exp(np.log1p(returns.dropna()).cumsum())
+
+
+def cagr(returns):
+    growth = cumulative_growth(returns)
+    if growth.empty:
+        return np.nan
+    return growth.iloc[-1] ** (TRADING_DAYS / len(growth)) - 1
+
+
+def sharpe_ratio(returns, risk_free_rate=0.0):
+    excess = returns.dropna() - risk_free_rate / TRADING_DAYS
+    if len(excess) < 2 or excess.std() == 0:
+        return np.nan
+    return excess.mean() / excess.std() * np.sqrt(TRADING_DAYS)
+
+
+def max_drawdown(returns):
+    growth = cumulative_growth(returns)
+    if growth.empty:
+        return np.nan
+    return (growth / growth.cummax().clip(lower=1) - 1).min()
+
+
+# `turnover` is the per-rebalance turnover from attribution.attribute_returns
+def summarize(returns, turnover):
+    return pd.Series({'cagr': cagr(returns),
+                      'sharpe': sharpe_ratio(returns),
+                      'max_drawdown': max_drawdown(returns),
+                      'turnover': turnover.mean() if len(turnover) else np.nan})
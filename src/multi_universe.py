@@ -0,0 +1,83 @@
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+import feature_creater
+import factor_engine
+import k_means_algorithm
+import portfolio_optimization
+import acquisition
+import instrumentation
+
+# Runs the strategy for several universes ({name: tickers}, e.g. app.INDEX_OPTIONS) at
+# once. Prices, indicators and monthly rows are per ticker, so they are fetched and
+# computed once for the union of the universes; each universe then gets its own
+# dollar-volume filter, returns and betas, clustering, optimization and benchmark, with
+# the same results as a separate run per universe.
+#
+#   python src/multi_universe.py --start 2019-01-01 --end 2025-01-01 --output results/
+
+
+# Returns {name: {'features', 'clusters', 'returns'}}. `start_date` is the first date of
+# the feature history and `displayed_start_date` the first date compared against the
+# benchmark, as in the app.
+def run_universes(universes, start_date, end_date, displayed_start_date, workers=None, fetcher=None, cache=None):
+    union = list(dict.fromkeys(t for tickers in universes.values() for t in tickers))
+
+    if fetcher is not None:
+        factor_data = fetcher.submit(factor_engine.load_factor_data, start_date)
+        benchmarks = {name: fetcher.submit(portfolio_optimization.download_benchmark, displayed_start_date, name)
+                      for name in universes}
+    else:
+        factor_data, benchmarks = None, {}
+
+    with instrumentation.stage('shared'):
+        monthly = feature_creater.load_monthly_rows(union, start_date, end_date, fetcher)
+        factor_data = factor_data.result() if factor_data is not None else factor_engine.load_factor_data(start_date)
+
+    results = {}
+    for name, tickers in universes.items():
+        with instrumentation.stage(name):
+            rows = monthly[monthly.index.get_level_values('ticker').isin(tickers)]
+            rows = instrumentation.run('monthly', feature_creater.filter_by_dollar_volume, rows, len(tickers))
+            features = feature_creater.create_monthly_features(rows, start_date, factor_data)
+            clusters = instrumentation.run('clusters', k_means_algorithm.run_k_means_algorithm, features)
+            benchmark = benchmarks[name].result() if name in benchmarks else None
+            with instrumentation.stage('portfolio'):
+                returns = portfolio_optimization.run_portfolio_optimization(clusters, displayed_start_date, name, workers,
+                                                                            cache, benchmark)
+        results[name] = {'features': features, 'clusters': clusters, 'returns': returns}
+    return results
+
+
+def main(argv=None):
+    from app import INDEX_OPTIONS
+
+    parser = argparse.ArgumentParser(description='Run the strategy for several index universes at once.')
+    parser.add_argument('--index', nargs='+', choices=list(INDEX_OPTIONS), default=list(INDEX_OPTIONS))
+    parser.add_argument('--start', required=True, help='first date compared against the benchmark')
+    parser.add_argument('--end', default=datetime.now().strftime('%Y-%m-%d'))
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--output', help='directory for one returns CSV per universe')
+    args = parser.parse_args(argv)
+
+    # Two extra years of history before the displayed start, as in the app
+    displayed_start_date = datetime.strptime(args.start, '%Y-%m-%d').date()
+    start_date = displayed_start_date - timedelta(days=365 * 2)
+    universes = {name: INDEX_OPTIONS[name] for name in args.index}
+
+    with acquisition.Acquisition() as fetcher:
+        results = run_universes(universes, start_date, args.end, displayed_start_date, args.workers, fetcher)
+
+    for name, result in results.items():
+        returns = result['returns']
+        print(f'{name}: {len(result["features"])} feature rows, cumulative returns')
+        print((returns.add(1).prod() - 1).to_string())
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            returns.to_csv(os.path.join(args.output, f'{name.replace(" ", "_")}_returns.csv'))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+
+# Dense fields x dates x tickers float32 panel for the monthly aggregation. The pipeline's
+# long (date, ticker) frames are converted only at the boundaries: daily fields are
+# densified one at a time from the frame's index codes and resampled straight to months,
+# so the daily data is never unstacked or restacked as a whole. Monthly resampling,
+# rolling means and cross-sectional ranks then run on dates x tickers arrays, with NaN
+# marking a missing (date, ticker). The daily frame itself (download and indicators)
+# is still a long float64 frame: this bounds the aggregation's memory, not the whole
+# pipeline's.
+
+
+# Sorted date and ticker axes of a (date, ticker) index and each row's position on them
+def frame_codes(index):
+    index = index.remove_unused_levels()
+    axes, codes = [], []
+    for level, level_codes in zip(index.levels, index.codes):
+        order = level.argsort()
+        position = np.empty(len(level), dtype=np.int64)
+        position[order] = np.arange(len(level))
+        axes.append(level[order])
+        codes.append(position[level_codes])
+    return pd.DatetimeIndex(axes[0]), axes[1], codes[0], codes[1]
+
+
+# Month-end labels of `dates` (sorted) and the first row of each month
+def month_groups(dates):
+    if len(dates) == 0:
+        return pd.DatetimeIndex([]), np.array([], dtype=np.int64)
+    periods = dates.to_period('M')
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    return periods[starts].to_timestamp(how='end').normalize(), starts
+
+
+# Last non-missing value in each month, per ticker
+def resample_last(x, starts):
+    rows = np.where(np.isnan(x), -1, np.arange(len(x), dtype=np.int64)[:, None])
+    last = np.maximum.reduceat(rows, starts, axis=0)
+    return np.where(last >= 0, np.take_along_axis(x, np.maximum(last, 0), axis=0), np.nan).astype(x.dtype)
+
+
+# Mean of the non-missing values in each month, per ticker
+def resample_mean(x, starts):
+    valid = ~np.isnan(x)
+    total = np.add.reduceat(np.where(valid, x, 0), starts, axis=0, dtype=np.float64)
+    count = np.add.reduceat(valid, starts, axis=0, dtype=np.int64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count > 0, total / count, np.nan).astype(x.dtype)
+
+
+RESAMPLERS = {'last': resample_last, 'mean': resample_mean}
+
+
+# Trailing mean over `window` rows of the non-missing values, NaN where fewer than
+# `min_periods` are present (pandas rolling(window, min_periods).mean())
+def rolling_mean(x, window, min_periods=None):
+    min_periods = window if min_periods is None else min_periods
+    valid = ~np.isnan(x)
+    total = np.cumsum(np.where(valid, x, 0), axis=0, dtype=np.float64)
+    count = np.cumsum(valid, axis=0, dtype=np.int64)
+    total[window:] -= total[:-window].copy()
+    count[window:] -= count[:-window].copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(count >= max(min_periods, 1), total / count, np.nan)
+
+
+# Rank of each value among the non-missing values of its row, ties averaged (pandas
+# rank(method='average')); missing values stay NaN
+def cross_sectional_rank(x, ascending=True):
+    keys = x if ascending else -x
+    order = np.argsort(keys, axis=1, kind='stable')
+    values = np.take_along_axis(keys, order, axis=1)
+
+    # Each sorted value's rank is the mean of the first and last position of its tie run;
+    # NaNs sort last and never tie, and are masked at the end
+    positions = np.broadcast_to(np.arange(x.shape[1]), x.shape)
+    starts = np.ones(x.shape, dtype=bool)
+    starts[:, 1:] = values[:, 1:] != values[:, :-1]
+    ends = np.ones(x.shape, dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    first = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, positions, x.shape[1])[:, ::-1], axis=1)[:, ::-1]
+
+    ranks = np.empty(x.shape)
+    np.put_along_axis(ranks, order, (first + last) / 2 + 1, axis=1)
+    ranks[np.isnan(x)] = np.nan
+    return ranks
+
+
+class Panel:
+    def __init__(self, values, dates, tickers, fields):
+        self.values = values
+        self.dates = dates
+        self.tickers = tickers
+        self.fields = list(fields)
+
+    # Monthly panel of a daily (date, ticker) frame, `how` mapping each field to 'last' or
+    # 'mean'. Only one daily field is held densely at a time.
+    @classmethod
+    def monthly_from_frame(cls, df, how, dtype=np.float32):
+        dates, tickers, date_codes, ticker_codes = frame_codes(df.index)
+        months, starts = month_groups(dates)
+        values = np.empty((len(how), len(months), len(tickers)), dtype=dtype)
+        daily = np.empty((len(dates), len(tickers)), dtype=dtype)
+        for i, (field, method) in enumerate(how.items()):
+            daily.fill(np.nan)
+            daily[date_codes, ticker_codes] = df[field].to_numpy()
+            values[i] = RESAMPLERS[method](daily, starts)
+        return cls(values, months, tickers, list(how))
+
+    # Long (date, ticker) float64 frame of the cells where `mask` (dates x tickers) is set,
+    # by default those with any field present
+    def to_frame(self, mask=None):
+        if mask is None:
+            mask = ~np.isnan(self.values).all(axis=0)
+        d, t = np.nonzero(mask)
+        index = pd.MultiIndex.from_arrays([self.dates[d], self.tickers[t]], names=['date', 'ticker'])
+        return pd.DataFrame({f: self.values[i][d, t].astype(np.float64) for i, f in enumerate(self.fields)},
+                            index=index)
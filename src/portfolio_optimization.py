@@ -2,33 +2,56 @@ from pypfopt.efficient_frontier import EfficientFrontier
 from pypfopt import risk_models
 from pypfopt import expected_returns
 import pandas as pd
-import yfinance as yf
 import matplotlib.ticker as mtick
 import matplotlib.pyplot as plt
 import numpy as np
+import functools
 import datetime as dt
 import streamlit as st
-
-
-def optimize_weights(prices, lower_bound=0):
+import price_store
+import max_sharpe
+import attribution
+import rebalance_scheduler
+import stage_cache
+import instrumentation
+
+
+# backend='active_set' solves the max Sharpe problem directly (see max_sharpe.py) and can
+# be warm-started with last month's weights, retrying with pypfopt if it doesn't converge;
+# backend='pypfopt' uses EfficientFrontier/SCS
+def optimize_weights(prices, lower_bound=0, mu=None, cov=None, backend='active_set', initial_weights=None, upper_bound=.1):
+    
+    returns = mu if mu is not None else expected_returns.mean_historical_return(prices=prices,
+                                                                            frequency=252)
     
-    returns = expected_returns.mean_historical_return(prices=prices,
-                                                      frequency=252)
+    cov = cov if cov is not None else risk_models.sample_cov(prices=prices,
+                                                           frequency=252)
     
-    cov = risk_models.sample_cov(prices=prices,
-                                 frequency=252)
+    if backend == 'active_set':
+        if initial_weights is not None:
+            initial_weights = pd.Series(initial_weights, dtype=float).reindex(returns.index).fillna(0).to_numpy()
+
+        try:
+            weights = max_sharpe.max_sharpe_weights(mu=returns.to_numpy(),
+                                                    cov=cov.loc[returns.index, returns.index].to_numpy(),
+                                                    lower_bound=lower_bound,
+                                                    upper_bound=upper_bound,
+                                                    initial_weights=initial_weights)
+            return max_sharpe.clean_weights(returns.index, weights)
+        except max_sharpe.ConvergenceError:
+            pass
     
     ef = EfficientFrontier(expected_returns=returns,
                            cov_matrix=cov,
-                           weight_bounds=(lower_bound, .1),
+                           weight_bounds=(lower_bound, upper_bound),
                            solver='SCS')
     
     weights = ef.max_sharpe()
     
     return ef.clean_weights()
 
-def tickers_for_each_month(df):
-    filtered_df = df[df['cluster']==3].copy()
+def tickers_for_each_month(df, cluster=3):
+    filtered_df = df[df['cluster']==cluster].copy()
 
     filtered_df = filtered_df.reset_index(level=1)
 
@@ -44,110 +67,64 @@ def tickers_for_each_month(df):
         
         fixed_dates[d.strftime('%Y-%m-%d')] = filtered_df.xs(d, level=0).index.tolist()
         
-    del fixed_dates['2025-01-01']
+    # The month after the last feature date has no data to trade on yet
+    last_date = df.index.get_level_values('date').max()
+    fixed_dates = {d: tickers for d, tickers in fixed_dates.items() if pd.Timestamp(d) <= last_date}
 
     return fixed_dates
 
-def download_portfolio_ticker_daily_prices(df):
+def download_portfolio_ticker_daily_prices(df, lookback_months=12):
     stocks = df.index.get_level_values('ticker').unique().tolist()
 
-    new_df = yf.download(tickers=stocks,
-                        start=df.index.get_level_values('date').unique()[0]-pd.DateOffset(months=12),
-                        end=df.index.get_level_values('date').unique()[-1])
+    new_df = price_store.download(stocks,
+                                  df.index.get_level_values('date').unique()[0]-pd.DateOffset(months=lookback_months),
+                                  df.index.get_level_values('date').unique()[-1])
 
     return new_df
 
-def get_portfolio_returns(df, fixed_dates):
+# Strategy returns plus per-ticker contributions, turnover and per-month failures
+def get_portfolio_attribution(df, fixed_dates, workers=None, shrinkage=False, backend='active_set',
+                              upper_bound=.1, lookback_months=12):
 
     returns_dataframe = np.log(df['Adj Close']).diff()
 
-    portfolio_df = pd.DataFrame()
+    optimizer = functools.partial(optimize_weights, backend=backend, upper_bound=upper_bound)
 
-    for start_date in fixed_dates.keys():
-        try:
+    month_weights, failures = rebalance_scheduler.run_rebalances(df['Adj Close'], fixed_dates, optimizer, workers,
+                                                                 shrinkage, lookback_months)
 
-            end_date = (pd.to_datetime(start_date)+pd.offsets.MonthEnd(0)).strftime('%Y-%m-%d')
-
-            cols = fixed_dates[start_date]
-
-            optimization_start_date = (pd.to_datetime(start_date)-pd.DateOffset(months=12)).strftime('%Y-%m-%d')
-
-            optimization_end_date = (pd.to_datetime(start_date)-pd.DateOffset(days=1)).strftime('%Y-%m-%d')
-            
-            optimization_df = df['Adj Close'][cols][optimization_start_date:optimization_end_date]
-
-            success = False
-            try:
-                weights = optimize_weights(prices=optimization_df,
-                                    lower_bound=round(1/(len(optimization_df.columns)*2),3))
-
-                weights = pd.DataFrame(weights, index=pd.Series(0))
-                
-                success = True
-            except:
-                print(f'Max Sharpe Optimization failed for {start_date}, Continuing with Equal-Weights')
-            
-            if success==False:
-                weights = pd.DataFrame([1/len(optimization_df.columns) for i in range(len(optimization_df.columns))],
-                                        index=optimization_df.columns.tolist(),
-                                        columns=pd.Series(0)).T
-            
-            temp_df = returns_dataframe[start_date:end_date]
-        
-            temp_df = temp_df.stack().to_frame('return').reset_index(level=0)\
-                    .merge(weights.stack().to_frame('weight').reset_index(level=0, drop=True),
-                            left_index=True,
-                            right_index=True)\
-                    .reset_index().set_index(['Date', 'Ticker']).unstack().stack()
-
-            temp_df['weighted_return'] = temp_df['return']*temp_df['weight']
-
-            temp_df = temp_df.groupby(level=0)['weighted_return'].sum().to_frame('Strategy Return')
-            
-            portfolio_df = pd.concat([portfolio_df, temp_df], axis=0)
-            
-        except Exception as e:
-            print(e)
-            
-    portfolio_df = portfolio_df.drop_duplicates()
-    return portfolio_df
+    result = attribution.attribute_returns(returns_dataframe, month_weights)
+    result['weights'] = month_weights
+    result['failures'] = failures
+    return result
 
+def get_portfolio_returns(df, fixed_dates, workers=None, shrinkage=False, backend='active_set'):
+    return get_portfolio_attribution(df, fixed_dates, workers, shrinkage, backend)['returns']
 
-def common_index_returns(portfolio_df, start_date, index_choice):
-    if index_choice == 'NASDAQ 100':
-        qqq = yf.download(tickers='QQQ',
-                    start=start_date,
-                    end=dt.date.today())
 
-        qqq_ret = np.log(qqq[['Adj Close']]).diff().dropna().rename({'Adj Close':'QQQ Buy&Hold'}, axis=1)
-        qqq_ret.columns = qqq_ret.columns.get_level_values(0)
-        portfolio_df = portfolio_df.merge(qqq_ret,
-                                        left_index=True,
-                                        right_index=True)   
-    
-    elif index_choice == 'Dow Jones':
-        dia = yf.download(tickers='DIA',
-                    start=start_date,
-                    end=dt.date.today())
+# Buy & hold benchmark ETF for each index choice (SPY for anything else)
+BENCHMARKS = {'NASDAQ 100': ('QQQ', 'QQQ Buy&Hold'),
+              'Dow Jones': ('DIA', 'DOW Jones Buy&Hold')}
+DEFAULT_BENCHMARK = ('SPY', 'SPY Buy&Hold')
+
 
-        dia_ret = np.log(dia[['Adj Close']]).diff().dropna().rename({'Adj Close':'DOW Jones Buy&Hold'}, axis=1)
-        dia_ret.columns = dia_ret.columns.get_level_values(0)
-        portfolio_df = portfolio_df.merge(dia_ret,
-                                        left_index=True,
-                                        right_index=True)   
+def download_benchmark(start_date, index_choice):
+    ticker, _ = BENCHMARKS.get(index_choice, DEFAULT_BENCHMARK)
+    return price_store.download([ticker], start_date, dt.date.today())
 
-    else:    
-        spy = yf.download(tickers='SPY',
-                    start=start_date,
-                    end=dt.date.today())
 
+# `benchmark_prices` (download_benchmark's result) can be fetched ahead of time
+def common_index_returns(portfolio_df, start_date, index_choice, benchmark_prices=None):
+    _, label = BENCHMARKS.get(index_choice, DEFAULT_BENCHMARK)
+    if benchmark_prices is None:
+        benchmark_prices = download_benchmark(start_date, index_choice)
 
-        spy_ret = np.log(spy[['Adj Close']]).diff().dropna().rename({'Adj Close':'SPY Buy&Hold'}, axis=1)
-        spy_ret.columns = spy_ret.columns.get_level_values(0)
+    benchmark_ret = np.log(benchmark_prices[['Adj Close']]).diff().dropna().rename({'Adj Close': label}, axis=1)
+    benchmark_ret.columns = benchmark_ret.columns.get_level_values(0)
 
-        portfolio_df = portfolio_df.merge(spy_ret,
-                                        left_index=True,
-                                        right_index=True)
+    portfolio_df = portfolio_df.merge(benchmark_ret,
+                                      left_index=True,
+                                      right_index=True)
 
     return portfolio_df
 
@@ -167,9 +144,23 @@ def draw_graph(portfolio_df):
     return fig
 
 
-def run_portfolio_optimization(df, displayed_start_date, index_choice):
-    fixed_dates = tickers_for_each_month(df)
-    daily_tickers_df = download_portfolio_ticker_daily_prices(df)
-    portfolio_df = get_portfolio_returns(daily_tickers_df, fixed_dates)
-    all_returns_df = common_index_returns(portfolio_df, displayed_start_date, index_choice)
-    return all_returns_df
+# get_portfolio_attribution's result with the benchmark's returns next to the strategy's
+# in 'returns'; the weights and contributions are what robustness.run_robustness needs to
+# resample the rebalances. With a stage_cache.StageCache, the fixed dates,
+# weights/returns and index comparison are only recomputed when their inputs change.
+def run_portfolio_attribution(df, displayed_start_date, index_choice, workers=None, cache=None, benchmark_prices=None):
+    cache = cache if cache is not None else stage_cache.NoCache()
+    fixed_dates = instrumentation.run('fixed_dates', cache.run, 'fixed_dates', tickers_for_each_month, df)
+    daily_tickers_df = instrumentation.run('download', download_portfolio_ticker_daily_prices, df)
+    with instrumentation.stage('rebalances') as record:
+        result = cache.run('attribution', functools.partial(get_portfolio_attribution, workers=workers),
+                           daily_tickers_df, fixed_dates)
+        record['rows'] = len(result['weights'])
+    all_returns_df = instrumentation.run('benchmark', cache.run, 'returns', common_index_returns, result['returns'],
+                                         displayed_start_date, index_choice, benchmark_prices,
+                                         key=stage_cache.as_of(dt.date.today()))
+    return {**result, 'returns': all_returns_df}
+
+
+def run_portfolio_optimization(df, displayed_start_date, index_choice, workers=None, cache=None, benchmark_prices=None):
+    return run_portfolio_attribution(df, displayed_start_date, index_choice, workers, cache, benchmark_prices)['returns']
@@ -0,0 +1,263 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+FIELDS = ['Adj Close', 'Close', 'High', 'Low', 'Open', 'Volume']
+
+# Stored closes that differ from a re-fetched bar by more than this were adjusted since
+ADJUSTMENT_TOLERANCE = 1e-5
+
+DEFAULT_STORE_DIR = os.environ.get('PRICE_STORE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'stock-portfolio-optimizer', 'prices'))
+
+
+# Price providers return daily OHLCV in the yf.download layout: a DatetimeIndex
+# and (field, ticker) columns
+class PriceProvider:
+    def fetch(self, tickers, start_date, end_date):
+        raise NotImplementedError
+
+
+# yf.download collects each call's results in module-level state, so concurrent calls
+# from several threads are serialised
+class YahooPriceProvider(PriceProvider):
+    lock = threading.Lock()
+
+    def fetch(self, tickers, start_date, end_date):
+        with self.lock:
+            return yf.download(tickers=tickers,
+                               start=start_date,
+                               end=end_date,
+                               auto_adjust=False,
+                               progress=False)
+
+
+# Serves prices from a directory of per-ticker Parquet files (the PriceStore layout),
+# e.g. a snapshot of the store for offline runs and tests
+class LocalFilePriceProvider(PriceProvider):
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, tickers, start_date, end_date):
+        frames = {}
+        for ticker in tickers:
+            frame = read_ticker_file(self.directory, ticker)
+            if frame is not None:
+                frames[ticker] = frame[pd.Timestamp(start_date):pd.Timestamp(end_date) - pd.Timedelta(days=1)]
+        return to_wide_frame(frames, tickers)
+
+
+# Wraps another provider with a fixed delay per call and, optionally, a number of
+# initial calls that fail, to exercise concurrent acquisition and retries offline
+class SimulatedLatencyProvider(PriceProvider):
+    def __init__(self, provider, latency=0.5, failures=0):
+        self.provider = provider
+        self.latency = latency
+        self.failures = failures
+        self.lock = threading.Lock()
+
+    def fetch(self, tickers, start_date, end_date):
+        time.sleep(self.latency)
+        with self.lock:
+            fail = self.failures > 0
+            self.failures -= fail
+        if fail:
+            raise ConnectionError('simulated provider failure')
+        return self.provider.fetch(tickers, start_date, end_date)
+
+
+def ticker_path(directory, ticker):
+    return os.path.join(directory, ticker.replace(os.sep, '_') + '.parquet')
+
+
+def read_ticker_file(directory, ticker):
+    path = ticker_path(directory, ticker)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)
+
+
+def to_wide_frame(frames, tickers):
+    columns = pd.MultiIndex.from_product([FIELDS, tickers], names=['Price', 'Ticker'])
+    frames = {t: f for t, f in frames.items() if not f.empty}
+    if not frames:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='Date'), dtype=float)
+
+    wide = pd.concat(frames, axis=1).swaplevel(axis=1)
+    wide.columns.names = ['Price', 'Ticker']
+    wide.index.name = 'Date'
+    return wide.reindex(columns=columns).sort_index()
+
+
+def split_by_ticker(wide, tickers):
+    if not isinstance(wide.columns, pd.MultiIndex):
+        wide = pd.concat({tickers[0]: wide}, axis=1).swaplevel(axis=1)
+
+    frames = {}
+    available = wide.columns.get_level_values(1)
+    for ticker in tickers:
+        if ticker not in available:
+            continue
+        frame = wide.xs(ticker, axis=1, level=1).reindex(columns=FIELDS).dropna(how='all')
+        frame.index = pd.DatetimeIndex(frame.index).tz_localize(None)
+        frame.index.name = 'Date'
+        frames[ticker] = frame.astype(float)
+    return frames
+
+
+# On-disk daily price store: one Parquet file per ticker plus a coverage index of the
+# [start, end) range already fetched for each ticker. Reads are served from disk and
+# only the missing leading/trailing ranges are fetched from the provider. A ticker's
+# coverage only grows when the provider returned rows for it (yf.download reports a
+# failed ticker as empty columns rather than raising). Trailing ranges start at the
+# last stored bar; if its re-fetched closes differ from the stored ones (a split or
+# dividend changed the adjustment), the ticker's whole history is fetched again.
+class PriceStore:
+    def __init__(self, directory=DEFAULT_STORE_DIR, provider=None):
+        self.directory = directory
+        self.provider = provider if provider is not None else YahooPriceProvider()
+        os.makedirs(directory, exist_ok=True)
+        self.coverage_path = os.path.join(directory, 'coverage.json')
+        self.coverage_lock = threading.Lock()
+
+    def load_coverage(self):
+        if not os.path.exists(self.coverage_path):
+            return {}
+        with open(self.coverage_path) as f:
+            return {t: (pd.Timestamp(s), pd.Timestamp(e)) for t, (s, e) in json.load(f).items()}
+
+    def save_coverage(self, coverage):
+        serialised = {t: [s.strftime('%Y-%m-%d'), e.strftime('%Y-%m-%d')] for t, (s, e) in coverage.items()}
+
+        def write_json(path):
+            with open(path, 'w') as f:
+                json.dump(serialised, f)
+
+        write_atomic(self.coverage_path, write_json)
+
+    def missing_ranges(self, tickers, start_date, end_date):
+        coverage = self.load_coverage()
+        missing = {}
+        for ticker in tickers:
+            if ticker not in coverage:
+                ranges = [(start_date, end_date)]
+            else:
+                covered_start, covered_end = coverage[ticker]
+                ranges = []
+                if start_date < covered_start:
+                    ranges.append((start_date, covered_start))
+                if end_date > covered_end:
+                    existing = read_ticker_file(self.directory, ticker)
+                    last_bar = existing.index[-1] if existing is not None and not existing.empty else covered_end
+                    ranges.append((min(last_bar, covered_end), end_date))
+            for r in ranges:
+                missing.setdefault(r, []).append(ticker)
+        return missing
+
+    def fetch_ranges(self, ranges):
+        fetched = {}
+        for (range_start, range_end), range_tickers in ranges.items():
+            wide = self.provider.fetch(range_tickers, range_start.strftime('%Y-%m-%d'), range_end.strftime('%Y-%m-%d'))
+            for ticker, frame in split_by_ticker(wide, range_tickers).items():
+                if not frame.empty:
+                    fetched.setdefault(ticker, []).append(frame)
+        return fetched
+
+    def update(self, tickers, start_date, end_date):
+        start_date, end_date = pd.Timestamp(start_date).normalize(), pd.Timestamp(end_date).normalize()
+
+        # Today's bar is still moving, so it is never marked as covered
+        covered_until = min(end_date, pd.Timestamp.today().normalize())
+
+        missing = self.missing_ranges(tickers, start_date, end_date)
+        if not missing:
+            return
+
+        fetched = self.fetch_ranges(missing)
+        coverage = self.load_coverage()
+
+        existing = {}
+        refetch = {}
+        for ticker, new_frames in fetched.items():
+            existing[ticker] = read_ticker_file(self.directory, ticker)
+            if existing[ticker] is not None and adjustment_changed(existing[ticker], pd.concat(new_frames)):
+                refetch.setdefault((min(coverage.get(ticker, (start_date,))[0], start_date), end_date), []).append(ticker)
+
+        for ticker, new_frames in self.fetch_ranges(refetch).items():
+            fetched[ticker], existing[ticker] = new_frames, None
+
+        for ticker, new_frames in fetched.items():
+            frame = pd.concat(([existing[ticker]] if existing[ticker] is not None else []) + new_frames)
+            frame = frame[~frame.index.duplicated(keep='last')].sort_index()
+            write_atomic(ticker_path(self.directory, ticker), frame.to_parquet)
+
+        # Concurrent updates of disjoint tickers each merge their ranges into the index
+        with self.coverage_lock:
+            coverage = self.load_coverage()
+            for ticker in fetched:
+                covered_start, covered_end = coverage.get(ticker, (start_date, covered_until))
+                coverage[ticker] = (min(covered_start, start_date), max(covered_end, covered_until))
+            self.save_coverage(coverage)
+
+    def download(self, tickers, start_date, end_date):
+        tickers = list(dict.fromkeys(tickers))
+        self.update(tickers, start_date, end_date)
+
+        start_date, last_date = pd.Timestamp(start_date), pd.Timestamp(end_date) - pd.Timedelta(days=1)
+        frames = {}
+        for ticker in tickers:
+            frame = read_ticker_file(self.directory, ticker)
+            if frame is not None:
+                frames[ticker] = frame[start_date:last_date]
+        return to_wide_frame(frames, tickers)
+
+
+# Whether the closes of `new` on the dates it shares with `stored` differ from the stored ones
+def adjustment_changed(stored, new):
+    shared = stored.index.intersection(new.index)
+    if shared.empty:
+        return False
+    old, fresh = stored.loc[shared, ['Adj Close', 'Close']], new.loc[shared, ['Adj Close', 'Close']]
+    both = old.notna() & fresh.notna()
+    return bool((~np.isclose(old, fresh, rtol=ADJUSTMENT_TOLERANCE, atol=0) & both).any(axis=None))
+
+
+def write_atomic(path, writer):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Created under a lock: acquisition threads ask for it concurrently, and two stores on
+# one directory would each have their own coverage lock
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PriceStore()
+        return _default_store
+
+
+def set_default_store(store):
+    global _default_store
+    with _default_store_lock:
+        _default_store = store
+
+
+# Drop-in replacement for yf.download(tickers, start, end) backed by the default store
+def download(tickers, start_date, end_date):
+    return get_default_store().download(tickers, start_date, end_date)
@@ -0,0 +1,169 @@
+import os
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+import rolling_moments
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# Each month's optimization only needs its 12-month price window, so the months are
+# independent and run on a process pool. The daily price matrix is placed in shared
+# memory once; workers attach to it and slice their window instead of receiving a
+# pickled copy per month. Expected returns and covariances are read off one rolling
+# moment engine in the parent (consecutive windows overlap by ~11 months) and sent
+# along with each month.
+
+_shared = {}
+
+
+# Start method of the worker pools. Workers are started from a fresh server process (or
+# spawned where fork servers don't exist) rather than forked from the caller, which may
+# be Streamlit's threaded server or hold acquisition threads and their locks; they only
+# receive picklable tasks and attach to the prices by shared-memory name. `preload`
+# modules are imported once in the fork server instead of in every worker.
+def pool_context(preload=()):
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['__main__', __name__, *preload])
+    return context
+
+
+# Row range of the `lookback_months` months before each rebalance date and the column
+# positions of that month's tickers
+def month_windows(prices, fixed_dates, lookback_months=12):
+    windows = []
+    for start_date, cols in fixed_dates.items():
+        optimization_start_date = pd.to_datetime(start_date) - pd.DateOffset(months=lookback_months)
+        optimization_end_date = pd.to_datetime(start_date) - pd.DateOffset(days=1)
+        row_start = prices.index.searchsorted(optimization_start_date, side='left')
+        row_stop = prices.index.searchsorted(optimization_end_date, side='right')
+        windows.append((start_date, row_start, row_stop, list(cols)))
+    return windows
+
+
+def attach_shared_prices(name, shape, dtype, index, columns):
+    block = shared_memory.SharedMemory(name=name)
+    _shared['block'] = block
+    _shared['values'] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    _shared['index'] = index
+    _shared['columns'] = columns
+
+
+def attach_local_prices(values, index, columns):
+    _shared.pop('block', None)
+    _shared['values'] = values
+    _shared['index'] = index
+    _shared['columns'] = columns
+
+
+# Runs one month: max Sharpe weights, or equal weights when the optimizer fails.
+# `initial_weights` (the previous month's weights) warm-starts optimizers that support it.
+# Returns (start_date, weights or None, failure message or None, seconds).
+def optimize_month(optimizer, window, moments=None, initial_weights=None):
+    start = time.perf_counter()
+    start_date, weights, failure = solve_month(optimizer, window, moments, initial_weights)
+    return start_date, weights, failure, time.perf_counter() - start
+
+
+def solve_month(optimizer, window, moments, initial_weights):
+    start_date, row_start, row_stop, cols = window
+    try:
+        positions = _shared['columns'].get_indexer(cols)
+        if (positions < 0).any():
+            missing = [c for c, p in zip(cols, positions) if p < 0]
+            raise KeyError(f'{missing} not in price data')
+
+        optimization_df = pd.DataFrame(_shared['values'][row_start:row_stop, positions],
+                                       index=_shared['index'][row_start:row_stop],
+                                       columns=cols)
+        if optimization_df.columns.empty:
+            raise ValueError('no tickers to optimize')
+    except Exception as e:
+        return start_date, None, f'{type(e).__name__}: {e}'
+
+    try:
+        lower_bound = round(1/(len(optimization_df.columns)*2), 3)
+        if moments is None:
+            weights = optimizer(prices=optimization_df, lower_bound=lower_bound, initial_weights=initial_weights)
+        else:
+            weights = optimizer(prices=optimization_df, lower_bound=lower_bound, mu=moments[0], cov=moments[1],
+                                initial_weights=initial_weights)
+        return start_date, pd.Series(weights, dtype=float), None
+    except Exception as e:
+        weights = pd.Series(1/len(optimization_df.columns), index=optimization_df.columns)
+        return start_date, weights, f'Max Sharpe optimization failed ({type(e).__name__}: {e}), continuing with equal weights'
+
+
+# Runs a run of consecutive months, each warm-started from the last optimized weights
+def optimize_months(tasks):
+    results = []
+    previous = None
+    for optimizer, window, moments in tasks:
+        result = optimize_month(optimizer, window, moments, previous)
+        if result[1] is not None and result[2] is None:
+            previous = result[1]
+        results.append(result)
+    return results
+
+
+# Optimizes every month of `fixed_dates` ({start date: tickers}) on `prices` (dates x
+# tickers adjusted closes) with
+# `optimizer(prices=..., lower_bound=..., mu=..., cov=..., initial_weights=...)`, mu/cov
+# coming from the rolling moment engine (Ledoit-Wolf shrunk with `shrinkage`) over the
+# `lookback_months` before each date.
+# Returns ({start date: weights Series}, {start date: failure message}) in date order;
+# months whose window could not be built have no weights.
+def run_rebalances(prices, fixed_dates, optimizer, workers=None, shrinkage=False, lookback_months=12):
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    windows = month_windows(prices, fixed_dates, lookback_months)
+    values = np.ascontiguousarray(prices.to_numpy(dtype=float))
+
+    engine = rolling_moments.RollingMoments(prices, shrinkage=shrinkage)
+    tasks = []
+    for window in windows:
+        _, row_start, row_stop, cols = window
+        try:
+            engine.move(row_start, row_stop)
+            moments = engine.moments(cols)
+        except Exception:
+            # Left to the worker, which reports why the window cannot be built
+            moments = None
+        tasks.append((optimizer, window, moments))
+
+    if workers <= 1 or len(windows) <= 1:
+        attach_local_prices(values, prices.index, prices.columns)
+        results = optimize_months(tasks)
+    else:
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        try:
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            context = pool_context([getattr(optimizer, 'func', optimizer).__module__])
+            with ProcessPoolExecutor(max_workers=min(workers, len(windows)), mp_context=context,
+                                     initializer=attach_shared_prices,
+                                     initargs=(block.name, values.shape, values.dtype, prices.index, prices.columns)) as pool:
+                # Contiguous runs of months keep most warm starts while balancing the load
+                size = -(-len(tasks) // (workers*2))
+                runs = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+                results = [r for run in pool.map(optimize_months, runs) for r in run]
+        finally:
+            block.close()
+            block.unlink()
+
+    instrumentation.record_months([{'date': start_date, 'tickers': len(window[3]), 'seconds': seconds, 'failure': failure}
+                                   for window, (start_date, _, failure, seconds) in zip(windows, results)])
+
+    weights, failures = {}, {}
+    for start_date, month_weights, failure, _ in results:
+        if month_weights is not None:
+            weights[start_date] = month_weights
+        if failure is not None:
+            failures[start_date] = failure
+            logger.warning('%s: %s', start_date, failure)
+    return weights, failures
+
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import matplotlib.ticker as mtick
+import matplotlib.pyplot as plt
+import metrics
+import attribution
+
+# Resampled versions of a backtest (run_portfolio_optimization's output) to judge how
+# much its CAGR, Sharpe ratio and maximum drawdown depend on the one history it was run
+# on. All paths are built as one paths x days array:
+#   method='bootstrap': circular block bootstrap of the days, drawing the same blocks for
+#                       the strategy and the benchmark so their correlation is kept,
+#   method='weights':   every rebalance's weights redrawn from a Dirichlet centred on the
+#                       optimized weights (higher `concentration` = closer to them) and
+#                       applied to the same daily per-ticker contributions; needs the
+#                       'weights' and 'contributions' of
+#                       portfolio_optimization.run_portfolio_attribution.
+# Metrics are computed the same way as metrics.py.
+
+N_PATHS = 10000
+BLOCK_SIZE = 21
+CONCENTRATION = 100
+LEVELS = (0.05, 0.5, 0.95)
+
+
+# Metrics of each row of `paths` (paths x days), as metrics.cagr / sharpe_ratio / max_drawdown
+def path_metrics(paths):
+    days = paths.shape[1]
+    growth = np.exp(np.cumsum(np.log1p(paths), axis=1))
+    peak = np.maximum(np.maximum.accumulate(growth, axis=1), 1)
+
+    std = paths.std(axis=1, ddof=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = np.where(std > 0, paths.mean(axis=1) / std * np.sqrt(metrics.TRADING_DAYS), np.nan)
+
+    return pd.DataFrame({'cagr': growth[:, -1] ** (metrics.TRADING_DAYS / days) - 1,
+                         'sharpe': sharpe,
+                         'max_drawdown': (growth / peak - 1).min(axis=1)})
+
+
+# Day indices of `n_paths` circular block bootstrap samples of `days` days
+def block_indices(days, n_paths=N_PATHS, block_size=BLOCK_SIZE, rng=None):
+    rng = np.random.default_rng(rng)
+    blocks = -(-days // block_size)
+    starts = rng.integers(0, days, size=(n_paths, blocks))
+    indices = (starts[:, :, None] + np.arange(block_size)) % days
+    return indices.reshape(n_paths, -1)[:, :days]
+
+
+# {column: paths x days} bootstrap samples of every column of `returns`
+def bootstrap_paths(returns, n_paths=N_PATHS, block_size=BLOCK_SIZE, rng=None):
+    indices = block_indices(len(returns), n_paths, block_size, rng)
+    return {column: returns[column].to_numpy(dtype=float)[indices] for column in returns.columns}
+
+
+# Strategy paths (paths x days) on `dates` with each rebalance of `month_weights`
+# ({start date: weights}) redrawn around the optimized weights. `contributions` are the
+# dates x tickers weight * return of the backtest (attribution.attribute_returns).
+def perturbed_weight_paths(contributions, month_weights, dates, n_paths=N_PATHS, concentration=CONCENTRATION,
+                           rng=None):
+    rng = np.random.default_rng(rng)
+    weights = attribution.rebalance_weights(month_weights)
+    contributions = contributions.reindex(index=dates, columns=weights.columns).fillna(0).to_numpy(dtype=float)
+
+    dates = pd.DatetimeIndex(dates)
+    ends = weights.index + pd.offsets.MonthEnd(0)
+    month = weights.index.searchsorted(dates, side='right') - 1
+
+    paths = np.zeros((n_paths, len(dates)))
+    for i, w in enumerate(weights.to_numpy(dtype=float)):
+        days = np.flatnonzero((month == i) & (dates <= ends[i]))
+        held = np.flatnonzero(w > 0)
+        if len(days) == 0 or len(held) == 0:
+            continue
+        draws = rng.gamma(concentration * w[held], size=(n_paths, len(held)))
+        ratio = draws / draws.sum(axis=1, keepdims=True) / w[held]
+        paths[:, days] = ratio @ contributions[np.ix_(days, held)].T
+    return paths
+
+
+# Quantiles (`levels`) of the metrics of each column's paths next to the observed
+# metrics, indexed by (series, metric)
+def confidence_bands(returns, path_metrics_by_column, levels=LEVELS):
+    rows = {}
+    for column, values in path_metrics_by_column.items():
+        observed = pd.Series({'cagr': metrics.cagr(returns[column]),
+                              'sharpe': metrics.sharpe_ratio(returns[column]),
+                              'max_drawdown': metrics.max_drawdown(returns[column])})
+        bands = values.quantile(list(levels)).T
+        bands.columns = [f'{level:.0%}' for level in levels]
+        bands.insert(0, 'observed', observed)
+        rows[column] = bands
+    return pd.concat(rows, names=['series', 'metric'])
+
+
+# Dates x levels quantiles of the cumulative return across `paths`
+def growth_bands(paths, dates, levels=LEVELS):
+    growth = np.exp(np.cumsum(np.log1p(paths), axis=1)) - 1
+    return pd.DataFrame(np.quantile(growth, levels, axis=0).T, index=dates, columns=[f'{level:.0%}' for level in levels])
+
+
+# `portfolio_df` is run_portfolio_optimization's output (strategy and benchmark daily
+# returns); `weights` and `contributions` come from the same run's attribution
+# (run_portfolio_attribution) and are only used by method='weights'. Returns a dict with
+#   'bands':  confidence bands of CAGR, Sharpe and max drawdown (confidence_bands),
+#   'growth': {column: cumulative return bands over time} (growth_bands).
+def run_robustness(portfolio_df, method='bootstrap', n_paths=N_PATHS, block_size=BLOCK_SIZE,
+                   concentration=CONCENTRATION, levels=LEVELS, seed=None, weights=None, contributions=None):
+    returns = portfolio_df.dropna()
+    rng = np.random.default_rng(seed)
+
+    if method == 'bootstrap':
+        paths = bootstrap_paths(returns, n_paths, block_size, rng)
+    elif method == 'weights':
+        if weights is None or contributions is None:
+            raise ValueError("method='weights' needs the rebalance weights and contributions")
+        paths = {'Strategy Return': perturbed_weight_paths(contributions, weights, returns.index,
+                                                           n_paths, concentration, rng)}
+    else:
+        raise ValueError(f'unknown method {method!r}, expected bootstrap or weights')
+
+    return {'bands': confidence_bands(returns, {c: path_metrics(p) for c, p in paths.items()}, levels),
+            'growth': {c: growth_bands(p, returns.index, levels) for c, p in paths.items()}}
+
+
+def draw_bands(portfolio_df, growth):
+    plt.style.use('ggplot')
+
+    fig, ax = plt.subplots(figsize=(16, 6))
+
+    observed = np.exp(np.log1p(portfolio_df.dropna()).cumsum()) - 1
+    for (column, bands), color in zip(growth.items(), plt.rcParams['axes.prop_cycle'].by_key()['color']):
+        ax.fill_between(bands.index, bands.iloc[:, 0], bands.iloc[:, -1], color=color, alpha=.2,
+                        label=f'{column} {bands.columns[0]}-{bands.columns[-1]}')
+        ax.plot(observed.index, observed[column], color=color, label=column)
+
+    ax.set_title('Strategy Returns with Resampled Confidence Bands')
+    ax.yaxis.set_major_formatter(mtick.PercentFormatter(1))
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Return')
+    ax.legend()
+
+    return fig
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+from pypfopt import risk_models
+
+# Annualised mean and covariance of daily returns over sliding price windows, for the
+# whole universe at once. Sums and cross-products of the daily returns are kept for the
+# current window and updated by adding the rows that enter and subtracting the rows that
+# leave, so consecutive (mostly overlapping) rebalance windows cost O(rows moved x n^2)
+# instead of a full recomputation. Moments for a month's tickers are then read off the
+# accumulators by index selection.
+#
+# The estimates match pypfopt on the window's price slice:
+#   - mean: expected_returns.mean_historical_return (geometric, frequency 252),
+#   - covariance: risk_models.sample_cov (pairwise-complete returns, ddof=1, made PSD),
+#   - shrinkage: CovarianceShrinkage.ledoit_wolf() (constant variance target, missing
+#     returns as zero), except that rows are counted over the whole universe rather than
+#     only the rows where one of the selected tickers has data.
+
+
+class RollingMoments:
+    def __init__(self, prices, frequency=252, shrinkage=False):
+        self.frequency = frequency
+        self.shrinkage = shrinkage
+        self.columns = prices.columns
+
+        # Returns row t is prices row t over row t-1, so a price window [start, stop)
+        # holds returns rows [start + 1, stop)
+        returns = prices.to_numpy(dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = np.vstack([np.full((1, returns.shape[1]), np.nan), returns[1:] / returns[:-1] - 1])
+
+        valid = np.isfinite(returns)
+        self.present = valid.astype(float)
+        self.returns = np.where(valid, returns, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.log_growth = np.where(valid, np.log1p(self.returns), 0.0)
+        self.any_present = valid.any(axis=1)
+
+        self.window = (0, 0)
+        self.reset()
+
+    def reset(self):
+        n = len(self.columns)
+        self.rows = 0
+        self.log_sum = np.zeros(n)
+        self.pair_count = np.zeros((n, n))      # M'M: rows where both tickers have a return
+        self.pair_sum = np.zeros((n, n))        # R'M: sum of i's returns where j has one
+        self.cross = np.zeros((n, n))           # R'R
+        if self.shrinkage:
+            self.square_cross = np.zeros((n, n))    # (R^2)'(R^2)
+            self.square_sum = np.zeros((n, n))      # (R^2)'R
+
+    def add(self, start, stop, sign=1.0):
+        if stop <= start:
+            return
+        r, m = self.returns[start:stop], self.present[start:stop]
+        self.rows += sign * self.any_present[start:stop].sum()
+        self.log_sum += sign * self.log_growth[start:stop].sum(axis=0)
+        self.pair_count += sign * (m.T @ m)
+        self.pair_sum += sign * (r.T @ m)
+        self.cross += sign * (r.T @ r)
+        if self.shrinkage:
+            r2 = r ** 2
+            self.square_cross += sign * (r2.T @ r2)
+            self.square_sum += sign * (r2.T @ r)
+
+    # Slide the accumulators to the price rows [start, stop)
+    def move(self, start, stop):
+        new_start, new_stop = start + 1, stop
+        old_start, old_stop = self.window
+        if new_start >= old_stop or new_stop <= old_start or new_stop <= new_start:
+            self.reset()
+            self.add(new_start, new_stop)
+        else:
+            self.add(new_start, old_start)
+            self.add(old_start, new_start, -1.0)
+            self.add(old_stop, new_stop)
+            self.add(new_stop, old_stop, -1.0)
+        self.window = (new_start, max(new_stop, new_start))
+
+    # Annualised (expected returns, covariance) for `tickers` over the current window
+    def moments(self, tickers):
+        tickers = pd.Index(tickers)
+        idx = self.columns.get_indexer(tickers)
+        if (idx < 0).any():
+            raise KeyError(f'{list(tickers[idx < 0])} not in price data')
+        grid = np.ix_(idx, idx)
+
+        count = self.pair_count[grid]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mu = np.exp(self.log_sum[idx] * self.frequency / np.diag(count)) - 1
+
+            if self.shrinkage:
+                cov = self.shrunk_covariance(idx)
+            else:
+                sums = self.pair_sum[grid]
+                cov = (self.cross[grid] - sums * sums.T / count) / (count - 1)
+                cov[count < 2] = np.nan
+
+        mu = pd.Series(mu, index=tickers)
+        cov = pd.DataFrame(cov * self.frequency, index=tickers, columns=tickers)
+        if np.isfinite(cov.to_numpy()).all():
+            cov = risk_models.fix_nonpositive_semidefinite(cov, fix_method='spectral')
+        return mu, cov
+
+    # Ledoit-Wolf shrinkage towards a constant variance target, as sklearn's ledoit_wolf
+    # on the zero-filled returns, with every centred sum expanded in the raw accumulators
+    def shrunk_covariance(self, idx):
+        grid = np.ix_(idx, idx)
+        n, p = self.rows, len(idx)
+        total = np.diag(self.pair_sum)[idx]
+        squares = np.diag(self.cross)[idx]
+        m = total / n
+
+        emp_cov = self.cross[grid] / n - np.outer(m, m)
+        if p == 1:
+            return emp_cov
+
+        # sum_t (x_ti - m_i)^2 (x_tj - m_j)^2 over all pairs
+        A, B, P = self.square_cross[grid], self.square_sum[grid], self.cross[grid]
+        mi, mj = m[:, None], m[None, :]
+        beta_ = (A - 2 * mj * B - 2 * mi * B.T + 4 * mi * mj * P
+                 + mj ** 2 * squares[:, None] + mi ** 2 * squares[None, :]
+                 - 2 * mi * mj ** 2 * total[:, None] - 2 * mi ** 2 * mj * total[None, :]
+                 + n * mi ** 2 * mj ** 2).sum()
+
+        emp_cov_trace = np.diag(emp_cov)
+        mu = emp_cov_trace.sum() / p
+        delta_ = (emp_cov ** 2).sum()
+        beta = (beta_ / n - delta_) / (p * n)
+        delta = (delta_ - 2 * mu * emp_cov_trace.sum() + p * mu ** 2) / p
+        beta = min(beta, delta)
+        shrinkage = 0 if beta == 0 else beta / delta
+        return (1 - shrinkage) * emp_cov + shrinkage * mu * np.eye(p)
@@ -0,0 +1,84 @@
+import os
+import glob
+import pandas as pd
+import feature_creater
+import factor_engine
+import instrumentation
+import price_store
+
+# Out-of-core version of feature_creater.load_and_create_all_features for universes too
+# large to hold daily. Every step except the dollar-volume rank is per ticker, so:
+#   1. each shard of tickers is downloaded, its indicators computed and resampled to
+#      months, and written to <output_dir>/monthly/part-<shard>.parquet,
+#   2. the dollar-volume filter runs on the monthly dollar volume of all shards (one
+#      column, months x tickers rows),
+#   3. each shard's filtered monthly rows get their returns and factor betas and are
+#      written to <output_dir>/features/part-<shard>.parquet.
+# Memory is bounded by the daily data of one shard. The result is the same as the
+# in-memory pipeline's; read it back with read_features(output_dir).
+
+SHARD_SIZE = 200
+
+
+def part_path(directory, shard):
+    return os.path.join(directory, f'part-{shard:05d}.parquet')
+
+
+def write_part(directory, shard, df):
+    price_store.write_atomic(part_path(directory, shard), df.reset_index().to_parquet)
+
+
+def read_parts(directory, columns=None):
+    frames = [pd.read_parquet(path, columns=columns) for path in sorted(glob.glob(os.path.join(directory, 'part-*.parquet')))]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True).set_index(['date', 'ticker'])
+
+
+def create_features_sharded(tickers, start_date, end_date, number_of_stocks, output_dir, shard_size=SHARD_SIZE,
+                            factor_data=None):
+    tickers = list(dict.fromkeys(tickers))
+    shards = [tickers[i:i + shard_size] for i in range(0, len(tickers), shard_size)]
+    monthly_dir = os.path.join(output_dir, 'monthly')
+    features_dir = os.path.join(output_dir, 'features')
+    for directory in [monthly_dir, features_dir]:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, 'part-*.parquet')):
+            os.remove(path)
+
+    with instrumentation.stage('monthly_shards'):
+        for shard, shard_tickers in enumerate(shards):
+            df = feature_creater.load_stock_data(shard_tickers, start_date, end_date)
+            df = feature_creater.calculate_indicators(df)
+            write_part(monthly_dir, shard, feature_creater.resample_to_monthly(df))
+            del df
+
+    with instrumentation.stage('dollar_volume_filter') as record:
+        dollar_volume = read_parts(monthly_dir, columns=['date', 'ticker', 'dollar_volume'])
+        if dollar_volume is None:
+            raise ValueError('no price data for any ticker')
+        kept = feature_creater.filter_by_dollar_volume(dollar_volume, number_of_stocks).index
+        record['rows'] = len(kept)
+
+    if factor_data is None:
+        factor_data = factor_engine.load_factor_data(start_date)
+
+    with instrumentation.stage('feature_shards'):
+        for shard in range(len(shards)):
+            path = part_path(monthly_dir, shard)
+            if not os.path.exists(path):
+                continue
+            monthly = pd.read_parquet(path).set_index(['date', 'ticker'])
+            monthly = monthly[monthly.index.isin(kept)].drop('dollar_volume', axis=1)
+            if monthly.empty:
+                continue
+            features = feature_creater.create_monthly_features(monthly, start_date, factor_data)
+            if not features.empty:
+                write_part(features_dir, shard, features)
+
+    return output_dir
+
+
+def read_features(output_dir):
+    features = read_parts(os.path.join(output_dir, 'features'))
+    return features.sort_index() if features is not None else None
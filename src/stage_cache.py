@@ -0,0 +1,162 @@
+import os
+import glob
+import hashlib
+import threading
+import datetime as dt
+import numpy as np
+import pandas as pd
+import price_store
+
+DEFAULT_CACHE_DIR = os.environ.get('STAGE_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'stock-portfolio-optimizer', 'stages'))
+DEFAULT_MAX_BYTES = int(os.environ.get('STAGE_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+
+# Disk cache of pipeline stage outputs (features, clusters, fixed dates, weights, returns).
+# Each output is pickled under a hash of its stage name, the pipeline source code and the
+# content of its inputs, so a stage is skipped whenever the same inputs come back, whether
+# from the same session, another user of the dashboard or a previous process. Reading an
+# entry refreshes its modification time and the least recently used entries are evicted
+# once the directory grows past `max_bytes`. Entries written by other library versions
+# get other keys, and an entry that fails to load for any reason is a miss and is deleted.
+#
+# Entries are unpickled, and unpickling runs whatever code the file's writer put in it: a
+# cache directory is as trusted as the code itself. It is created readable and writable
+# by its owner only; don't point STAGE_CACHE_DIR at a directory other accounts can write.
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def source_fingerprint():
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(SOURCE_DIR, '*.py'))):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Updates `digest` with the content of `value`: frames by their hashed values, index and
+# columns, containers recursively, anything else by type and repr
+def update_fingerprint(digest, value):
+    digest.update(type(value).__name__.encode())
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr((list(value.columns), list(value.dtypes.astype(str)))).encode())
+        else:
+            digest.update(repr((value.name, str(value.dtype))).encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.shape, str(value.dtype))).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(str(len(value)).encode())
+        for k, v in value.items():
+            update_fingerprint(digest, k)
+            update_fingerprint(digest, v)
+    elif isinstance(value, (list, tuple)):
+        digest.update(str(len(value)).encode())
+        for v in value:
+            update_fingerprint(digest, v)
+    else:
+        digest.update(repr(value).encode())
+
+
+# Date a result computed now is valid for: inputs ending in the future still change
+# every day, inputs ending in the past do not
+def as_of(end_date):
+    return min(pd.Timestamp(end_date), pd.Timestamp(dt.date.today())).strftime('%Y-%m-%d')
+
+
+class StageCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+        self.source = source_fingerprint()
+
+    def key(self, stage, *inputs):
+        digest = hashlib.sha256()
+        digest.update(stage.encode())
+        digest.update(self.source.encode())
+        digest.update(f'pandas {pd.__version__} numpy {np.__version__}'.encode())
+        update_fingerprint(digest, inputs)
+        return f'{stage}-{digest.hexdigest()}'
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            value = pd.read_pickle(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated, or written by library versions this process can't load
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        return value
+
+    def put(self, key, value):
+        price_store.write_atomic(self.path(key), lambda tmp_path: pd.to_pickle(value, tmp_path))
+        self.evict()
+
+    # Deletes the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, '*.pkl')):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    # func(*args, **kwargs), served from the cache when the stage has already run on the
+    # same arguments. `key` adds values the result depends on without being arguments
+    # (e.g. the as-of date of downloaded data); None results are not cached.
+    def run(self, stage, func, *args, key=(), **kwargs):
+        cache_key = self.key(stage, args, kwargs, key)
+        value = self.get(cache_key)
+        if value is None:
+            value = func(*args, **kwargs)
+            if value is not None:
+                self.put(cache_key, value)
+        return value
+
+
+# Runs every stage without caching
+class NoCache:
+    def run(self, stage, func, *args, key=(), **kwargs):
+        return func(*args, **kwargs)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = StageCache()
+        return _default_cache
+
+
+def set_default_cache(cache):
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
@@ -0,0 +1,137 @@
+import os
+import sys
+import argparse
+import functools
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import k_means_algorithm
+import portfolio_optimization
+import rebalance_scheduler
+import attribution
+import metrics
+
+# Backtests a grid of strategy parameters on one feature panel and one daily price matrix:
+#   rsi_targets:     initial RSI centroids (one cluster per target)
+#   cluster:         which cluster is traded each month
+#   upper_bound:     maximum weight per ticker
+#   lookback_months: length of the optimization window before each rebalance
+# Features and prices are computed once. Clustering only depends on the RSI targets, so
+# each distinct set is clustered once in the parent; the optimizations and attribution of
+# every configuration then run on a process pool that receives the prices once per worker.
+#
+#   python src/sweep.py --index "Dow Jones" --start 2018-01-01 --end 2024-12-31 \
+#       --rsi-targets 30,45,55,75 --rsi-targets 25,50,75 --cluster 2 3 \
+#       --upper-bound 0.1 0.2 --lookback 6 12 --output sweep.csv
+
+DEFAULT_GRID = {'rsi_targets': [tuple(k_means_algorithm.TARGET_RSI_VALUES)],
+                'cluster': [3],
+                'upper_bound': [.1],
+                'lookback_months': [12]}
+
+_panel = {}
+
+
+# Every combination of the grid values (missing parameters take the app's defaults);
+# combinations trading a cluster that does not exist are dropped
+def parameter_grid(grid):
+    grid = {**DEFAULT_GRID, **grid}
+    names = list(DEFAULT_GRID)
+    configs = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    for config in configs:
+        config['rsi_targets'] = tuple(config['rsi_targets'])
+    return [c for c in configs if 0 <= c['cluster'] < len(c['rsi_targets'])]
+
+
+def attach_prices(prices):
+    _panel['prices'] = prices
+    _panel['returns'] = np.log(prices).diff()
+
+
+# Optimizes and attributes one configuration on the attached prices
+def run_configuration(task):
+    config, fixed_dates, shrinkage, backend = task
+    optimizer = functools.partial(portfolio_optimization.optimize_weights, backend=backend,
+                                  upper_bound=config['upper_bound'])
+    month_weights, failures = rebalance_scheduler.run_rebalances(_panel['prices'], fixed_dates, optimizer, workers=1,
+                                                                 shrinkage=shrinkage,
+                                                                 lookback_months=config['lookback_months'])
+    result = attribution.attribute_returns(_panel['returns'], month_weights)
+    summary = metrics.summarize(result['returns']['Strategy Return'], result['turnover'])
+    return {**config, **summary.to_dict(), 'months': len(month_weights), 'failures': len(failures)}
+
+
+# `features` is the monthly feature panel (feature_creater), `prices` the daily adjusted
+# closes (dates x tickers) covering every ticker and the longest lookback. Returns one
+# row per configuration with its CAGR, Sharpe ratio, maximum drawdown and mean turnover.
+def run_sweep(features, prices, grid=None, workers=None, shrinkage=False, backend='active_set'):
+    configs = parameter_grid(grid or {})
+    workers = (os.cpu_count() or 1) if workers is None else workers
+
+    clustered = {targets: k_means_algorithm.run_k_means_algorithm(features, target_rsi_values=list(targets))
+                 for targets in dict.fromkeys(c['rsi_targets'] for c in configs)}
+    tasks = [(config, portfolio_optimization.tickers_for_each_month(clustered[config['rsi_targets']], config['cluster']),
+              shrinkage, backend)
+             for config in configs]
+
+    if workers <= 1 or len(tasks) <= 1:
+        attach_prices(prices)
+        rows = [run_configuration(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=rebalance_scheduler.pool_context([__name__]),
+                                 initializer=attach_prices, initargs=(prices,)) as pool:
+            rows = list(pool.map(run_configuration, tasks))
+
+    return pd.DataFrame(rows, columns=list(DEFAULT_GRID) + ['cagr', 'sharpe', 'max_drawdown', 'turnover',
+                                                            'months', 'failures'])
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Backtest a grid of strategy parameters on one feature panel.')
+    universe = parser.add_mutually_exclusive_group(required=True)
+    universe.add_argument('--index', help='one of the app\'s index universes')
+    universe.add_argument('--tickers', nargs='+')
+    parser.add_argument('--start', required=True, help='first date of the feature history')
+    parser.add_argument('--end', required=True)
+    parser.add_argument('--rsi-targets', action='append', type=lambda s: tuple(float(v) for v in s.split(',')),
+                        help='comma separated RSI centroids; repeat for several sets')
+    parser.add_argument('--cluster', nargs='+', type=int)
+    parser.add_argument('--upper-bound', nargs='+', type=float)
+    parser.add_argument('--lookback', nargs='+', type=int, help='lookback lengths in months')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--shrinkage', action='store_true')
+    parser.add_argument('--backend', default='active_set', choices=['active_set', 'pypfopt'])
+    parser.add_argument('--output', help='CSV file for the results table')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import feature_creater
+
+    args = parse_args(argv)
+    if args.index:
+        from app import INDEX_OPTIONS
+        tickers = INDEX_OPTIONS[args.index]
+    else:
+        tickers = args.tickers
+
+    grid = {name: values for name, values in [('rsi_targets', args.rsi_targets),
+                                              ('cluster', args.cluster),
+                                              ('upper_bound', args.upper_bound),
+                                              ('lookback_months', args.lookback)] if values}
+
+    features = feature_creater.load_and_create_all_features(tickers, args.start, args.end, len(tickers))
+    lookback = max(grid.get('lookback_months', DEFAULT_GRID['lookback_months']))
+    prices = portfolio_optimization.download_portfolio_ticker_daily_prices(features, lookback)['Adj Close']
+
+    results = run_sweep(features, prices, grid, args.workers, args.shrinkage, args.backend)
+    if args.output:
+        results.to_csv(args.output, index=False)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(results.sort_values('sharpe', ascending=False).to_string(index=False))
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,5 @@
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path[:0] = [SRC, os.path.join(SRC, 'benchmarks')]
@@ -0,0 +1,45 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+import factor_engine
+
+sm = pytest.importorskip('statsmodels.api')
+from statsmodels.regression.rolling import RollingOLS
+
+FACTORS = ['Mkt-RF', 'SMB', 'HML', 'RMW', 'CMA']
+
+
+# Monthly factor rows of tickers with different life spans and a few missing factors
+def ragged_factor_rows(n_tickers=60, n_months=120, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('2010-01-01', periods=n_months, freq='MS')
+    parts = []
+    for i in range(n_tickers):
+        start = rng.integers(0, n_months - 12)
+        d = dates[start:rng.integers(start + 10, n_months + 1)]
+        frame = pd.DataFrame(rng.normal(size=(len(d), len(FACTORS))), columns=FACTORS)
+        frame['return_1m'] = frame.to_numpy() @ rng.normal(size=len(FACTORS)) + rng.normal(size=len(d)) * .1
+        if i % 5 == 0:
+            frame.iloc[rng.integers(0, len(d)), 0] = np.nan
+        frame.index = pd.MultiIndex.from_product([d, [f'T{i:03d}']], names=['date', 'ticker'])
+        parts.append(frame)
+    return pd.concat(parts).sort_index()
+
+
+# The per-ticker RollingOLS that rolling_betas replaced
+def reference_betas(data):
+    def fit(x):
+        return RollingOLS(endog=x['return_1m'], exog=sm.add_constant(x.drop('return_1m', axis=1)),
+                          window=min(24, x.shape[0]), min_nobs=len(x.columns) + 1).fit(params_only=True).params.drop('const', axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return data.groupby(level=1, group_keys=False).apply(fit)
+
+
+def test_rolling_betas_match_rolling_ols():
+    data = ragged_factor_rows()
+    expected = reference_betas(data).reindex(data.index)
+    result = factor_engine.rolling_betas(data, chunk_size=16)
+    np.testing.assert_array_equal(result.isna().to_numpy(), expected.isna().to_numpy())
+    np.testing.assert_allclose(result.to_numpy(), expected[result.columns].to_numpy(), rtol=1e-7, atol=1e-9)
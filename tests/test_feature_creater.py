@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+import feature_creater
+
+# calculate_indicators against the pandas_ta code paths it replaced (pandas_ta's own
+# formulas below; checked against pandas_ta itself when that is installed)
+
+
+def rma(x, length):
+    return x.ewm(alpha=1/length, min_periods=length).mean()
+
+
+def rsi(close, length=20):
+    negative = close.diff(1)
+    positive = negative.copy()
+    positive[positive < 0] = 0
+    negative[negative > 0] = 0
+    positive_average, negative_average = rma(positive, length), rma(negative, length)
+    return 100 * positive_average / (positive_average + negative_average.abs())
+
+
+def bbands(close, length=20):
+    mid = close.rolling(length, min_periods=length).mean()
+    std = close.rolling(length, min_periods=length).std(ddof=0)
+    return pd.concat([mid - 2*std, mid, mid + 2*std], axis=1)
+
+
+def atr(high, low, close, length=14):
+    previous = close.shift(1)
+    true_range = pd.concat([high - low, high - previous, previous - low], axis=1).abs().max(axis=1)
+    true_range.iloc[:1] = np.nan
+    return rma(true_range, length)
+
+
+def ema(close, length):
+    close = close.copy()
+    sma = close[0:length].mean()
+    close[:length - 1] = np.nan
+    close.iloc[length - 1] = sma
+    return close.ewm(span=length, adjust=False).mean()
+
+
+def macd(close):
+    return (ema(close, 12) - ema(close, 26)).to_frame()
+
+
+def zscore(x):
+    return x.sub(x.mean()).div(x.std())
+
+
+def reference_indicators(df, ta):
+    df = df.copy()
+    close = df.groupby(level=1)['adj close']
+    df['rsi'] = close.transform(lambda x: ta.rsi(close=x, length=20))
+    for i, name in enumerate(['bb_low', 'bb_mid', 'bb_high']):
+        df[name] = close.transform(lambda x: ta.bbands(close=np.log1p(x), length=20).iloc[:, i])
+    df['atr'] = df.groupby(level=1, group_keys=False).apply(
+        lambda x: zscore(ta.atr(high=x['high'], low=x['low'], close=x['close'], length=14)))
+    df['macd'] = close.apply(lambda x: zscore(ta.macd(close=x, length=20).iloc[:, 0])).droplevel(0)
+    return df
+
+
+class PandasTa:
+    rsi = staticmethod(lambda close, length: rsi(close, length))
+    bbands = staticmethod(lambda close, length: bbands(close, length))
+    atr = staticmethod(lambda high, low, close, length: atr(high, low, close, length))
+    macd = staticmethod(lambda close, length: macd(close))
+
+
+# Daily OHLCV with late listings, missing days and missing closes
+def ragged_ohlcv(n_tickers=30, n_days=400, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-01', periods=n_days)
+    frames = []
+    for j in range(n_tickers):
+        d = dates[rng.integers(0, n_days // 3):] if j % 3 == 0 else dates
+        if j % 5 == 1:
+            d = d.delete(rng.choice(len(d), 10, replace=False))
+        close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(d))))
+        frame = pd.DataFrame({'adj close': close * 0.98, 'close': close,
+                              'high': close * (1 + np.abs(rng.normal(0, 0.01, len(d)))),
+                              'low': close * (1 - np.abs(rng.normal(0, 0.01, len(d)))),
+                              'open': close * (1 + rng.normal(0, 0.005, len(d))),
+                              'volume': rng.integers(1e5, 1e7, len(d)).astype(float)}, index=d)
+        if j % 7 == 2:
+            frame.iloc[rng.choice(np.arange(40, len(d)), 3, replace=False), 0] = np.nan
+        frame['ticker'] = f'T{j:03d}'
+        frames.append(frame)
+    df = pd.concat(frames)
+    df.index.name = 'date'
+    return df.set_index('ticker', append=True).sort_index()
+
+
+COLUMNS = ['rsi', 'bb_low', 'bb_mid', 'bb_high', 'atr', 'macd']
+
+
+def assert_indicators_match(ta):
+    df = ragged_ohlcv()
+    result = feature_creater.calculate_indicators(df.copy())
+    expected = reference_indicators(df, ta).reindex(result.index)
+    for name in COLUMNS:
+        np.testing.assert_array_equal(result[name].isna(), expected[name].isna(), err_msg=name)
+        np.testing.assert_allclose(result[name], expected[name], rtol=1e-9, atol=1e-10, err_msg=name)
+
+
+def test_indicators_match_pandas_ta_formulas():
+    assert_indicators_match(PandasTa)
+
+
+def test_indicators_match_pandas_ta():
+    assert_indicators_match(pytest.importorskip('pandas_ta'))
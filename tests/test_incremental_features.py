@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import synthetic_data
+import price_store
+import feature_creater
+import incremental_features
+
+N_TICKERS = 30
+
+
+def write_source(directory, ohlcv):
+    wide = ohlcv.rename(columns={'adj close': 'Adj Close'}).rename(columns=str.title).unstack('ticker')
+    wide = wide.rename_axis(['Price', 'Ticker'], axis=1)
+    for ticker, frame in price_store.split_by_ticker(wide, list(wide.columns.get_level_values(1).unique())).items():
+        frame.to_parquet(price_store.ticker_path(directory, ticker))
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    ohlcv = synthetic_data.daily_ohlcv(N_TICKERS, 5)
+    dates = ohlcv.index.get_level_values('date')
+    factors = synthetic_data.factor_table(dates[0], dates[-1])
+    monkeypatch.setattr(feature_creater.factor_engine, 'load_factor_data', lambda *args, **kwargs: factors)
+
+    directory = tmp_path / 'source'
+    directory.mkdir()
+    write_source(str(directory), ohlcv)
+    monkeypatch.setattr(price_store, '_default_store',
+                        price_store.PriceStore(str(tmp_path / 'store'), price_store.LocalFilePriceProvider(str(directory))))
+    return str(directory), ohlcv
+
+
+# A 2:1 split of `ticker` on `split_date`: every earlier price is halved and volume doubled
+def split(ohlcv, ticker, split_date):
+    ohlcv = ohlcv.copy()
+    before = (ohlcv.index.get_level_values('ticker') == ticker) & (ohlcv.index.get_level_values('date') < split_date)
+    ohlcv.loc[before, ['adj close', 'close', 'open', 'high', 'low']] /= 2
+    ohlcv.loc[before, 'volume'] *= 2
+    return ohlcv
+
+
+def test_update_after_split_matches_full_recompute(source, tmp_path):
+    directory, ohlcv = source
+    dates = ohlcv.index.get_level_values('date')
+    tickers = synthetic_data.ticker_names(N_TICKERS)
+    start, end = dates[0], dates[-1] + pd.Timedelta(days=1)
+    middle = start + pd.DateOffset(years=4)
+    state_path = os.path.join(tmp_path, 'state.pkl')
+
+    incremental_features.update_features(state_path, tickers, start, middle, N_TICKERS)
+    # The most traded ticker, so it passes the dollar-volume filter
+    ticker = (ohlcv['adj close'] * ohlcv['volume']).groupby(level='ticker').sum().idxmax()
+    write_source(directory, split(ohlcv, ticker, middle + pd.DateOffset(months=3)))
+    result = incremental_features.update_features(state_path, tickers, start, end, N_TICKERS).sort_index()
+
+    expected = feature_creater.load_and_create_all_features(tickers, start, end, N_TICKERS).sort_index()
+    assert result.index.equals(expected.index)
+    np.testing.assert_allclose(result.to_numpy(), expected[result.columns].to_numpy(), rtol=1e-4, atol=1e-4)
@@ -0,0 +1,33 @@
+import threading
+import instrumentation
+
+
+def test_concurrent_profiles_run_one_at_a_time():
+    started, release = threading.Barrier(2), threading.Event()
+    recorders = {}
+
+    def session(name):
+        recorders[name] = instrumentation.Recorder(trace_memory=False, profile=True)
+        if name == 'second':
+            started.wait()
+        with instrumentation.recording(recorders[name]):
+            if name == 'first':
+                started.wait()
+                release.wait()
+            sum(range(1000))
+
+    threads = [threading.Thread(target=session, args=(name,)) for name in ['first', 'second']]
+    for thread in threads:
+        thread.start()
+    threads[1].join()
+    release.set()
+    threads[0].join()
+
+    assert 'function calls' in recorders['first'].profile_stats()
+    assert recorders['second'].profile_stats().startswith('Not profiled')
+
+    # The profiler is free again once both runs are done
+    recorder = instrumentation.Recorder(trace_memory=False, profile=True)
+    with instrumentation.recording(recorder):
+        sum(range(1000))
+    assert 'function calls' in recorder.profile_stats()
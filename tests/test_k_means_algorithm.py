@@ -0,0 +1,53 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+import k_means_algorithm
+
+KMeans = pytest.importorskip('sklearn.cluster').KMeans
+
+COLUMNS = ['garman_klass_vol', 'rsi', 'bb_low', 'bb_mid', 'bb_high', 'atr', 'macd', 'return_1m', 'return_2m',
+           'return_3m', 'return_6m', 'return_9m', 'return_12m', 'Mkt-RF', 'SMB', 'HML', 'RMW', 'CMA']
+
+
+# Monthly feature rows with a different set of tickers every month
+def monthly_features(n_months=24, seed=1):
+    rng = np.random.default_rng(seed)
+    parts = []
+    for date in pd.date_range('2015-01-31', periods=n_months, freq='M'):
+        n = rng.integers(60, 101)
+        x = rng.normal(size=(n, len(COLUMNS))) * 0.1
+        x[:, 1] = rng.uniform(20, 85, n)
+        x[:, 2:5] = rng.normal(4, .5, (n, 3))
+        tickers = [f'T{i:03d}' for i in rng.choice(300, n, replace=False)]
+        parts.append(pd.DataFrame(x, columns=COLUMNS, index=pd.MultiIndex.from_product([[date], tickers],
+                                                                                          names=['date', 'ticker'])))
+    return pd.concat(parts)
+
+
+# The per-month sklearn KMeans that run_k_means_algorithm replaced
+def reference_clusters(df):
+    init = k_means_algorithm.initial_centroids(df.columns)
+
+    def fit(g):
+        g = g.copy()
+        g['cluster'] = KMeans(n_clusters=len(init), random_state=0, init=init, n_init=1).fit(g).labels_
+        return g
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return df.groupby('date', group_keys=False).apply(fit)
+
+
+def test_clusters_match_sklearn():
+    df = monthly_features()
+    expected = reference_clusters(df)
+    result = k_means_algorithm.run_k_means_algorithm(df)
+    np.testing.assert_array_equal(result['cluster'].reindex(expected.index), expected['cluster'])
+
+
+def test_empty_clusters_match_sklearn():
+    df = monthly_features(n_months=1).iloc[:6].copy()
+    df['rsi'] = [80, 81, 82, 83, 84, 85]
+    expected = reference_clusters(df)
+    result = k_means_algorithm.run_k_means_algorithm(df)
+    assert result['cluster'].tolist() == expected['cluster'].tolist()
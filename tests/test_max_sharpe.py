@@ -0,0 +1,45 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+import max_sharpe
+from pypfopt import EfficientFrontier
+
+pytest.importorskip('clarabel')
+
+UPPER_BOUND = 0.1
+
+
+# Annualized moments of correlated daily returns; 'duplicate' repeats an asset and
+# 'constant' has one asset that never moves, both leave the covariance singular
+def moments(seed, kind=None, n=30, days=252):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.02, (days, n)) + rng.normal(0, 0.01, (days, 1))
+    if kind == 'duplicate':
+        returns[:, 1] = returns[:, 0]
+    if kind == 'constant':
+        returns[:, 0] = 0.0
+    returns = pd.DataFrame(returns)
+    return returns.mean().to_numpy() * 252, returns.cov().to_numpy() * 252
+
+
+def sharpe(w, mu, cov):
+    return w @ mu / np.sqrt(w @ cov @ w)
+
+
+@pytest.mark.parametrize('kind', [None, 'duplicate', 'constant'])
+def test_max_sharpe_matches_clarabel(kind):
+    for seed in range(10):
+        mu, cov = moments(seed, kind)
+        lower_bound = round(1 / (2 * len(mu)), 3)
+        weights = max_sharpe.max_sharpe_weights(mu, cov, lower_bound, UPPER_BOUND)
+
+        assert abs(weights.sum() - 1) < 1e-8
+        assert (weights >= lower_bound - 1e-8).all() and (weights <= UPPER_BOUND + 1e-8).all()
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            frontier = EfficientFrontier(pd.Series(mu), pd.DataFrame(cov), weight_bounds=(lower_bound, UPPER_BOUND),
+                                         solver='CLARABEL')
+            expected = np.array(list(frontier.max_sharpe().values()))
+        assert sharpe(weights, mu, cov) >= sharpe(expected, mu, cov) - 1e-6
@@ -0,0 +1,48 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+import rolling_moments
+import rebalance_scheduler
+from pypfopt import expected_returns, risk_models
+
+
+# Daily prices with late listings and scattered missing days
+def ragged_prices(n_tickers=40, seed=3):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2015-01-01', '2018-12-31')
+    tickers = [f'T{i:03d}' for i in range(n_tickers)]
+    prices = pd.DataFrame(np.exp(np.cumsum(rng.normal(3e-4, 0.015, (len(dates), n_tickers)), 0)) * 50,
+                          index=dates, columns=tickers)
+    for i in range(n_tickers):
+        if rng.random() < .3:
+            prices.iloc[:rng.integers(0, len(dates) // 2), i] = np.nan
+        prices.iloc[rng.choice(len(dates), 20), i] = np.nan
+    return prices, rng
+
+
+@pytest.mark.parametrize('shrinkage', [False, True])
+def test_moments_match_pypfopt(shrinkage):
+    prices, rng = ragged_prices()
+    months = pd.date_range('2016-01-01', '2018-12-01', freq='MS')
+    fixed_dates = {m.strftime('%Y-%m-%d'): list(rng.choice(prices.columns, 15, replace=False)) for m in months}
+
+    engine = rolling_moments.RollingMoments(prices, shrinkage=shrinkage)
+    for start_date, start, stop, tickers in rebalance_scheduler.month_windows(prices, fixed_dates):
+        engine.move(start, stop)
+        mu, cov = engine.moments(tickers)
+
+        start_date = pd.to_datetime(start_date)
+        window = prices[tickers][start_date - pd.DateOffset(months=12):start_date - pd.DateOffset(days=1)]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            expected_mu = expected_returns.mean_historical_return(window)
+            expected_cov = (risk_models.CovarianceShrinkage(window).ledoit_wolf() if shrinkage
+                            else risk_models.sample_cov(window))
+
+        # A ticker without returns in the window is NaN here and 0 in pypfopt
+        listed = np.isfinite(mu.to_numpy())
+        assert (expected_mu.to_numpy()[~listed] == 0).all()
+        np.testing.assert_allclose(mu.to_numpy()[listed], expected_mu.to_numpy()[listed], rtol=1e-8, atol=1e-10)
+        np.testing.assert_array_equal(np.isnan(cov.to_numpy()), np.isnan(expected_cov.to_numpy()))
+        np.testing.assert_allclose(cov.to_numpy(), expected_cov.to_numpy(), rtol=1e-8, atol=1e-12)